@@ -0,0 +1,139 @@
+# admission.py
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from scheduler import Scheduler, Job, INTERACTIVE, CHAT, current_job
+
+# Interactive and chat queries processed at once, and how many more may wait for a slot before new ones are turned away
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+# Per-client token bucket: sustained queries per second and burst size; a rate of 0 disables it
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "2"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "10"))
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+
+
+class Rejected(Exception):
+    """Raised when a query is turned away; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}, please retry in {math.ceil(retry_after)}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-client token buckets in front of a ``Scheduler`` with a bounded wait queue.
+
+        async with admission.admit(sender, CHAT):
+            reply = await process_query(...)
+
+    A client over its rate, or a query arriving when the queue is full, is
+    rejected at once with ``Rejected``. The retry hint for overload is based
+    on recent query durations. Buckets are kept for the
+    ``max_clients`` most recent clients. Queued queries are served by the
+    scheduler's weighted fair queuing, with ``max_concurrent`` shared by
+    interactive and chat queries.
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, rate: float = ADMISSION_RATE,
+                 burst: float = ADMISSION_BURST, max_clients: int = ADMISSION_MAX_CLIENTS,
+                 scheduler: Scheduler = None):
+        self.scheduler = scheduler or Scheduler(limit=max(1, max_concurrent))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self.avg_duration = 1.0
+        self.stats = {"admitted": 0, "queued": 0, "rate_limited": 0, "overloaded": 0, "timed_out": 0}
+        self._buckets = OrderedDict()
+
+    async def acquire(self, client: str = None, job_class: str = INTERACTIVE) -> Job:
+        """Wait for a slot or raise ``Rejected``; pair with ``release``, and run the query under ``charging``.
+
+        ``client`` None skips the rate limit, for callers that cannot be told apart.
+        """
+        if self.rate > 0 and client is not None:
+            wait = self._bucket(client).take()
+            if wait:
+                self.stats["rate_limited"] += 1
+                raise Rejected("Too many requests", wait)
+
+        if not self.scheduler.ready(job_class):
+            if self.scheduler.waiting(INTERACTIVE, CHAT) >= self.max_queue:
+                self.stats["overloaded"] += 1
+                raise Rejected("Server busy", self._retry_after())
+            self.stats["queued"] += 1
+        try:
+            job = await self.scheduler.acquire(job_class, client, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise Rejected("Server busy", self._retry_after()) from None
+        self.stats["admitted"] += 1
+        return job
+
+    def release(self, job: Job):
+        self.scheduler.release(job)
+        # Moving average of how long a slot is held, for the retry hint
+        self.avg_duration += 0.1 * ((time.monotonic() - job.started) - self.avg_duration)
+
+    @staticmethod
+    @contextmanager
+    def charging(job: Job):
+        """Charge bulk work started inside the block to ``job``'s client."""
+        token = current_job.set(job)
+        try:
+            yield job
+        finally:
+            current_job.reset(token)
+
+    @asynccontextmanager
+    async def admit(self, client: str = None, job_class: str = INTERACTIVE):
+        job = await self.acquire(client, job_class)
+        try:
+            with self.charging(job):
+                yield job
+        finally:
+            self.release(job)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, active=self.scheduler.active[INTERACTIVE] + self.scheduler.active[CHAT],
+                    waiting=self.scheduler.waiting(INTERACTIVE, CHAT), scheduler=self.scheduler.snapshot())
+
+    def _bucket(self, client: str) -> TokenBucket:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket
+
+    def _retry_after(self) -> float:
+        waiting = self.scheduler.waiting(INTERACTIVE, CHAT)
+        return max(1.0, self.avg_duration * (waiting + 1) / self.scheduler.limit)
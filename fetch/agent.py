@@ -1,275 +1,215 @@
-import os
-import requests
 import json
-from dotenv import load_dotenv
+import asyncio
+import secrets
+from typing import Optional
 from uagents_core.contrib.protocols.chat import (
     chat_protocol_spec,
     ChatMessage,
     ChatAcknowledgement,
     TextContent,
     StartSessionContent,
+    EndSessionContent,
 )
 from uagents import Agent, Context, Protocol, Model
 from datetime import datetime, timezone, timedelta
 from uuid import uuid4
-load_dotenv()
-# ASI1 API settings
-ASI1_API_KEY = os.getenv("ASI1_API_KEY") # Replace with your ASI1 key
-ASI1_BASE_URL = "https://api.asi1.ai/v1"
-ASI1_HEADERS = {
-    "Authorization": f"Bearer {ASI1_API_KEY}",
-    "Content-Type": "application/json"
-}
-
-CANISTER_ID = "w7lou-c7777-77774-qaamq-cai"
-BASE_URL = "http://127.0.0.1:4943"
-
-HEADERS = {
-    "Host": f"{CANISTER_ID}.localhost",
-    "Content-Type": "application/json"
-}
-
-HEADERSUPDATE = {
-    "Host": f"{CANISTER_ID}.localhost",
-    "Content-Type": "application/json",
-    'X-Ic-Force-Update': 'true'
-}
-
+from config import ASI1_BASE_URL, ASI1_HEADERS, CANISTER_BASE_URL, CANISTER_HEADERS
+from transport import asi1_pool, canister_pool, close_pools, pool_stats
+from tool_runner import run_tool_calls
+from canister import CanisterClient, CANISTER_STATS_INTERVAL
+from intent_router import IntentRouter, INTENT_ROUTER_DEGRADED_THRESHOLD
+from responses import template_response, uses_template, degraded_response, UNAVAILABLE_MESSAGE
+from encoding import ToolResultEncoder
+from response_cache import ResponseCache
+from streaming import STREAM_RESPONSES, ChatStream, StreamRegistry, StreamInterrupted, chat_message
+from metrics import metrics, MetricsReport
+from sessions import Session, SessionStore, SESSION_SAVE_INTERVAL
+from admission import AdmissionController, Rejected
+from scheduler import CHAT, BACKGROUND
+from asi1 import ASI1Client, ASI1Unavailable
+from tool_registry import ToolSet
+from payment_links import PaymentLinkCache, PAYMENT_PREWARM_INTERVAL
+from outbox import Outbox, OUTBOX_FLUSH_INTERVAL, outbox_path
+
+asi1 = ASI1Client(asi1_pool(ASI1_BASE_URL, ASI1_HEADERS))
+# Query vs forced-update mode is chosen per tool by the client
+canister = CanisterClient(canister_pool(CANISTER_BASE_URL, CANISTER_HEADERS))
+
+router = IntentRouter({"get_events", "get_event_by_id", "payment", "canister_address"})
+response_cache = ResponseCache()
+encoder = ToolResultEncoder()
+payment_links = PaymentLinkCache(canister)
+# Creates are written to a local outbox first and sent with an idempotency key
+outbox = Outbox(canister, outbox_path("EventVerse"))
+# Interactive, chat and bulk work share one scheduler
+admission = AdmissionController()
 # Function definitions for ASI1 function calling
-tools = [
-    {
-    "type": "function",
-    "function": {
-        "name": "create_event",
-        "description": "Create a new event in the ICP canister",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "name": {"type": "string", "description": "Name of the event"},
-                "date": {"type": "string", "description": "Date of the event"},
-                "location": {"type": "string", "description": "Location of the event"},
-                "price": {"type": "string", "description": "Price of the event but dont add any currency"},
-                "capacity": { "type": "number", "description": "capacity of the event, default value used if omitted" },
-                "min_age": { "type": "number", "description": "Optional minimum age for the event" }
-            },
-            "required": ["name", "date", "location", "price","capacity"],
-            "additionalProperties": False
-        },
-        "strict": True
-    }
-},
-     {
-        "type": "function",
-        "function": {
-            "name": "get_events",
-            "description": "Get the list of events from the ICP canister please always use ETH for event's price",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "limit": {
-                        "type": "number",
-                        "description": "Limit the number of events returned"
-                    },
-                    "offset": {
-                        "type": "number",
-                        "description": "Skip this many events from the start"
-                    }
-                },
-                "required": [],
-                "additionalProperties": False
-            },
-            "strict": True
-        }
-    },
- {
-    "type": "function",
-    "function": {
-        "name": "get_event_by_id",
-        "description": "Get details of a specific event by its ID",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "eventId": {"type": "string", "description": "ID of the event"}
-            },
-            "required": ["eventId"],
-            "additionalProperties": False
-        },
-        "strict": True
-    }
-},
-
-      {
-        "type": "function",
-        "function": {
-            "name": "canister_address",
-            "description": "Returns the address of this canister",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "required": [],
-                "additionalProperties": False
-            },
-            "strict": True
-        }
-    },
-     {
-    "type": "function",
-    "function": {
-        "name": "payment",
-        "description": "Returns the payment link for a given event",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "eventId": {
-                    "type": "string",
-                    "description": "ID of the event to pay for"
-                }
-            },
-            "required": ["eventId"],
-            "additionalProperties": False
-        },
-        "strict": True
-    }
-}
-
-   
-   
-]
-
-async def call_icp_endpoint(func_name: str, args: dict):
-    if func_name == "get_event_by_id":
-        event_id = args.get("eventId")
-        url = f"{BASE_URL}/events/{event_id}"
-        response = requests.get(url, headers=HEADERSUPDATE, json={})
-    elif func_name == "get_events":
-        url = f"{BASE_URL}/events"
-        response = requests.get(url, headers=HEADERSUPDATE, json={}, params=args)
-    elif func_name == "payment":
-        event_id = args.get("eventId")
-        url = f"{BASE_URL}/payment/{event_id}"
-        response = requests.get(url, headers=HEADERSUPDATE, json={})
-    elif func_name == "create_event":
-        url = f"{BASE_URL}/events"
-        response = requests.post(url, headers=HEADERSUPDATE, json=args)
-    elif func_name == "canister_address":
-        url = f"{BASE_URL}/canister-address"
-        response = requests.get(url, headers=HEADERSUPDATE, json={})
-    else:
-        raise ValueError(f"Unsupported function call: {func_name}")
-    response.raise_for_status()
-    return response.json()
+toolset = ToolSet(
+    ["create_event", "create_events_bulk", "get_events", "get_event_by_id", "get_events_by_ids", "canister_address",
+     "payment"],
+    canister, handlers={"payment": payment_links.handler, "create_event": outbox.handler}, encoder=encoder,
+    scheduler=admission.scheduler,
+)
 
-async def process_query(query: str, ctx: Context) -> str:
+async def execute_tool(func_name: str, arguments: dict, ctx: Context, session: Session = None,
+                       compact: bool = False) -> str:
+    """Run one tool; with ``compact`` event data is encoded as a table because only ASI1 reads it."""
+    ctx.logger.info(f"Executing {func_name} with arguments: {arguments}")
+
+    result = await toolset.call(func_name, arguments)
+    if session is not None:
+        for event in toolset.records(func_name, result):
+            session.remember(event)
+    return toolset.format(func_name, arguments, result, compact)
+
+def tool_error_content(e: Exception) -> str:
+    error_content = {
+        "error": f"Tool execution failed: {str(e)}",
+        "status": "failed"
+    }
+    return json.dumps(error_content)
+
+async def process_query(query: str, ctx: Context, on_chunk=None, session: Session = None) -> str:
+    """Answer ``query``; if ``on_chunk`` is given the ASI1 answer is streamed to it as it arrives.
+
+    With a ``session``, "that one" is resolved to the sender's last event,
+    earlier turns are replayed to ASI1 and this turn is added to the session.
+    """
+    if session is None:
+        return await answer_query(query, ctx, on_chunk)
+    query = session.resolve(query)
+    turn = []
+    answer = await answer_query(query, ctx, on_chunk, session, turn)
+    session.note_references(query)
+    session.add_turn(turn + [{"role": "assistant", "content": answer}])
+    return answer
+
+async def answer_query(query: str, ctx: Context, on_chunk=None, session: Session = None, turn: list = None) -> str:
+    """Answer one query; the user message and any tool round are appended to ``turn``."""
+    history = session.history() if session is not None else []
+    # Follow-ups depend on this sender's history, so their answers are never shared
+    shareable = session is None or not session.is_follow_up(query)
+    turn = turn if turn is not None else []
     try:
-        # Step 1: Initial call to ASI1 with user query and tools
+        # Repeated questions are answered straight from the response cache
+        cached = response_cache.get(query) if shareable else None
+        if cached is not None:
+            turn.append({"role": "user", "content": query})
+            return cached
+
         initial_message = {
             "role": "user",
             "content": query
         }
-        payload = {
-            "model": "asi1-mini",
-            "messages": [initial_message],
-            "tools": tools,
-            "temperature": 0.7,
-            "max_tokens": 1024
-        }
-        response = requests.post(
-            f"{ASI1_BASE_URL}/chat/completions",
-            headers=ASI1_HEADERS,
-            json=payload
-        )
-        response.raise_for_status()
-        response_json = response.json()
+        turn.append(initial_message)
+
+        # Step 1: Plain commands are mapped to tools locally, the rest goes to ASI1
+        with metrics.span("intent"):
+            tool_calls, confidence = router.route(query)
+            if tool_calls:
+                ctx.logger.info(f"Intent router matched {tool_calls[0]['function']['name']} ({confidence:.2f})")
+                assistant_message = {"role": "assistant", "content": "", "tool_calls": tool_calls}
+            else:
+                payload = {
+                    "model": "asi1-mini",
+                    "messages": history + [initial_message],
+                    "tools": toolset.schemas,
+                    "temperature": 0.7,
+                    "max_tokens": 1024
+                }
+                try:
+                    response_json = await asi1.complete(payload)
+                except ASI1Unavailable as e:
+                    # Without ASI1 the router's best guess is still better than no answer
+                    ctx.logger.warning(f"{e}, falling back to the intent router")
+                    tool_calls, confidence = router.route(query, INTENT_ROUTER_DEGRADED_THRESHOLD)
+                    if not tool_calls:
+                        return UNAVAILABLE_MESSAGE
+                    assistant_message = {"role": "assistant", "content": "", "tool_calls": tool_calls}
+                else:
+                    metrics.record_usage(response_json.get("usage"))
 
-        # Step 2: Parse tool calls from response
-        tool_calls = response_json["choices"][0]["message"].get("tool_calls", [])
-        messages_history = [initial_message, response_json["choices"][0]["message"]]
+                    # Step 2: Parse tool calls from response
+                    assistant_message = response_json["choices"][0]["message"]
+                    tool_calls = assistant_message.get("tool_calls", [])
+        messages_history = [initial_message, assistant_message]
 
         if not tool_calls:
             return "I couldn't determine what Event information you're looking for. Please try rephrasing your question."
 
-        # Step 3: Execute tools and format results
-        for tool_call in tool_calls:
-            func_name = tool_call["function"]["name"]
-            arguments = json.loads(tool_call["function"]["arguments"])
-            tool_call_id = tool_call["id"]
+        # A different phrasing that resolved to the same tool calls shares a templated answer
+        cached = response_cache.get_by_signature(tool_calls)
+        if cached is not None:
+            if shareable:
+                response_cache.put(query, tool_calls, cached, templated=True)
+            return cached
 
-            ctx.logger.info(f"Executing {func_name} with arguments: {arguments}")
-
-            try:
-                result = await call_icp_endpoint(func_name, arguments)
-
-                # Customize response formatting based on the tool
-                if func_name == "get_events":
-                    formatted = "\n".join([
-                        f"- {e.get('name')} | Date: {e.get('date')} | Location: {e.get('location')} | Price: {e.get('price')} ETH"
-                        for e in result.get("events", [])
-                    ])
-                    content_to_send = formatted or "No events found."
-
-                elif func_name == "get_event_by_id":
-                    e = result
-                    content_to_send = (
-                        f"Event: {e.get('name')}\n"
-                        f"Date: {e.get('date')}\n"
-                        f"Location: {e.get('location')}\n"
-                        f"Price: {e.get('price')} ETH\n"
-                        f"Capacity: {e.get('capacity', 'N/A')}\n"
-                        f"Min Age: {e.get('min_age', 'N/A')}"
-                    )
-
-                elif func_name == "create_event":
-                    content_to_send = (
-                        f"✅ Event created successfully!\n"
-                        f"Event ID: {result.get('id')}\n"
-                        f"Name: {result.get('name')}\n"
-                        f"Date: {result.get('date')}\n"
-                        f"Location: {result.get('location')}\n"
-                        f"Price: {result.get('price')}"
-                    )
-
-                elif func_name == "payment":
-                    content_to_send = f"💳 Payment link for event {arguments.get('eventId')}: {result.get('paymentLink')}"
-
-                elif func_name == "canister_address":
-                    content_to_send = f"📦 Canister address: {result.get('address')}"
-
-                else:
-                    content_to_send = json.dumps(result)
-
-            except Exception as e:
-                error_content = {
-                    "error": f"Tool execution failed: {str(e)}",
-                    "status": "failed"
-                }
-                content_to_send = json.dumps(error_content)
-
-            tool_result_message = {
-                "role": "tool",
-                "tool_call_id": tool_call_id,
-                "content": content_to_send
-            }
-            messages_history.append(tool_result_message)
+        # Step 3: Execute tools and format results
+        # Output only ASI1 will read is sent in the compact table form
+        compact = asi1.available() and not uses_template(tool_calls)
+        tool_messages, failed = await run_tool_calls(
+            tool_calls, lambda func_name, arguments: execute_tool(func_name, arguments, ctx, session, compact),
+            on_error=tool_error_content
+        )
+        messages_history.extend(tool_messages)
+        turn.extend(messages_history[1:])
 
+        # Our own formatting is already the answer for simple lookups
+        answer = template_response(tool_calls, tool_messages, failed)
+        if answer is not None:
+            if shareable:
+                response_cache.put(query, tool_calls, answer, templated=True)
+            return answer
 
         # Step 4: Send results back to ASI1 for final answer
         final_payload = {
             "model": "asi1-mini",
-            "messages": messages_history,
+            "messages": history + messages_history,
             "temperature": 0.7,
             "max_tokens": 1024
         }
-        final_response = requests.post(
-            f"{ASI1_BASE_URL}/chat/completions",
-            headers=ASI1_HEADERS,
-            json=final_payload
-        )
-        final_response.raise_for_status()
-        final_response_json = final_response.json()
-
-        # Step 5: Return the model's final answer
-        return final_response_json["choices"][0]["message"]["content"]
+        with metrics.span("final"):
+            try:
+                if on_chunk is None:
+                    final_response_json = await asi1.complete(final_payload)
+                    metrics.record_usage(final_response_json.get("usage"))
 
+                    # Step 5: Return the model's final answer
+                    answer = final_response_json["choices"][0]["message"]["content"]
+                else:
+                    # Step 5 (streaming): forward deltas as ASI1 produces them
+                    final_payload["stream"] = True
+                    parts = []
+                    try:
+                        async for event in asi1.stream(final_payload):
+                            # Usage, when sent, arrives on the last event
+                            metrics.record_usage(event.get("usage"))
+                            choices = event.get("choices") or [{}]
+                            delta = (choices[0].get("delta") or {}).get("content")
+                            if delta:
+                                parts.append(delta)
+                                await on_chunk(delta)
+                    except Exception as e:
+                        if not parts:
+                            raise
+                        # Part of the answer is already out, so the caller has to end it as an error
+                        raise StreamInterrupted(str(e) or type(e).__name__) from e
+                    answer = "".join(parts)
+            except ASI1Unavailable as e:
+                # Degraded answers are not cached, ASI1 will phrase them once it is back
+                ctx.logger.warning(f"{e}, answering with the raw tool output")
+                answer = degraded_response(tool_messages)
+                if on_chunk is not None:
+                    await on_chunk(answer)
+                return answer
+
+        if not failed and shareable:
+            response_cache.put(query, tool_calls, answer)
+        return answer
+
+    except StreamInterrupted as e:
+        ctx.logger.error(f"Answer stream interrupted: {str(e)}")
+        raise
     except Exception as e:
         ctx.logger.error(f"Error processing query: {str(e)}")
         return f"An error occurred while processing your request: {str(e)}"
@@ -281,10 +221,60 @@ agent = Agent(
 )
 class Request(Model):
     message: str
+    # Optional; pass back the session_id of an earlier response to ask follow-up questions
+    session_id: Optional[str] = None
+    # Optional; rate limits are applied per client_id (or session_id)
+    client_id: Optional[str] = None
 
 class Response(Model):
     status: str
     message: str
+    retry_after: Optional[float] = None
+    session_id: Optional[str] = None
+
+class StreamStart(Model):
+    stream_id: str
+    session_id: Optional[str] = None
+
+class StreamPoll(Model):
+    stream_id: str
+    cursor: int = 0
+
+class StreamChunk(Model):
+    status: str
+    stream_id: str
+    text: str
+    cursor: int
+    done: bool
+    # Set on the final chunk when the answer was cut off
+    error: Optional[str] = None
+
+class PaymentLinkInvalidate(Model):
+    # Omit to drop every cached link
+    event_id: Optional[str] = None
+
+class PaymentLinkInvalidated(Model):
+    dropped: int
+
+streams = StreamRegistry()
+sessions = SessionStore()
+
+def rest_session(request):
+    """``(session_id, session)`` for a REST call.
+
+    Only ids this agent issued continue a session; anything else, including
+    a missing, expired or made-up id, starts a new one under a random id.
+    """
+    if request.session_id and f"rest:{request.session_id}" in sessions:
+        session_id = request.session_id
+    else:
+        session_id = secrets.token_urlsafe(16)
+    return session_id, sessions.get(f"rest:{session_id}")
+
+def rest_client(request) -> Optional[str]:
+    # REST handlers do not see the caller's address; anonymous callers only count against the global cap
+    client = request.client_id or request.session_id
+    return f"rest:{client}" if client else None
 
 @agent.on_rest_post('/chat',Request,Response)
 async def handle_chat_message(ctx: Context, request):
@@ -296,11 +286,61 @@ async def handle_chat_message(ctx: Context, request):
     ctx.logger.info(f"Received message: {received_message}")
 
     # Prepare the chat message to send
-    response_text = await process_query(received_message, ctx)
+    try:
+        async with admission.admit(rest_client(request)):
+            session_id, session = rest_session(request)
+            response_text = await process_query(received_message, ctx, session=session)
+    except Rejected as e:
+        ctx.logger.warning(f"Rejected REST query: {e}")
+        return Response(status="rejected", message=str(e), retry_after=e.retry_after)
 
 
     # Return a response to the REST call
-    return Response(status="success", message=response_text)
+    return Response(status="success", message=response_text, session_id=session_id)
+
+@agent.on_rest_post('/chat/stream', Request, StreamStart)
+async def start_chat_stream(ctx: Context, request):
+    # Runs the query in the background; poll /chat/stream/poll with the returned id
+    ctx.logger.info(f"Received streamed message: {request.message}")
+    stream_id, buffer = streams.create()
+    try:
+        job = await admission.acquire(rest_client(request))
+    except Rejected as e:
+        ctx.logger.warning(f"Rejected streamed query: {e}")
+        await buffer.write(str(e))
+        buffer.finish()
+        return StreamStart(stream_id=stream_id)
+    session_id, session = rest_session(request)
+
+    async def run():
+        error = None
+        try:
+            with admission.charging(job):
+                response_text = await process_query(request.message, ctx, on_chunk=buffer.write, session=session)
+            if not buffer.text:
+                # Template and error answers are not streamed by ASI1
+                await buffer.write(response_text)
+        except StreamInterrupted as e:
+            error = str(e)
+        except BaseException as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            admission.release(job)
+            buffer.finish(error)
+
+    buffer.task = asyncio.create_task(run())
+    return StreamStart(stream_id=stream_id, session_id=session_id)
+
+@agent.on_rest_post('/chat/stream/poll', StreamPoll, StreamChunk)
+async def poll_chat_stream(ctx: Context, request):
+    # Long-polls: returns as soon as new text is available or the answer is complete
+    buffer = streams.get(request.stream_id)
+    if buffer is None:
+        return StreamChunk(status="not_found", stream_id=request.stream_id, text="", cursor=request.cursor, done=True)
+    text, cursor, done = await buffer.read(request.cursor)
+    return StreamChunk(status="success", stream_id=request.stream_id, text=text, cursor=cursor, done=done,
+                       error=buffer.error if done else None)
 
 chat_proto = Protocol(spec=chat_protocol_spec)
 
@@ -316,11 +356,40 @@ async def handle_chat_message(ctx: Context, sender: str, msg: ChatMessage):
         for item in msg.content:
             if isinstance(item, StartSessionContent):
                 ctx.logger.info(f"Got a start session message from {sender}")
+                sessions.start(sender)
+                continue
+            elif isinstance(item, EndSessionContent):
+                ctx.logger.info(f"Got an end session message from {sender}")
+                sessions.end(sender)
                 continue
             elif isinstance(item, TextContent):
                 ctx.logger.info(f"Got a message from {sender}: {item.text}")
-                response_text = await process_query(item.text, ctx)
-                ctx.logger.info(f"Response text: {response_text}")
+                session = sessions.get(sender)
+                try:
+                    job = await admission.acquire(sender, CHAT)
+                except Rejected as e:
+                    ctx.logger.warning(f"Rejected message from {sender}: {e}")
+                    await ctx.send(sender, chat_message([TextContent(type="text", text=str(e))]))
+                    continue
+                try:
+                    with admission.charging(job):
+                        if STREAM_RESPONSES:
+                            stream = ChatStream(lambda content: ctx.send(sender, chat_message(content)))
+                            try:
+                                response_text = await process_query(
+                                    item.text, ctx, on_chunk=stream.write, session=session
+                                )
+                            except StreamInterrupted as e:
+                                await stream.close(str(e))
+                                continue
+                            ctx.logger.info(f"Response text: {response_text}")
+                            if await stream.close():
+                                continue
+                        else:
+                            response_text = await process_query(item.text, ctx, session=session)
+                            ctx.logger.info(f"Response text: {response_text}")
+                finally:
+                    admission.release(job)
                 response = ChatMessage(
                     timestamp=datetime.now(timezone.utc),
                     msg_id=uuid4(),
@@ -346,6 +415,77 @@ async def handle_chat_acknowledgement(ctx: Context, sender: str, msg: ChatAcknow
 
 agent.include(chat_proto)
 
+def agent_counters() -> dict:
+    return {
+        "canister": canister.stats(),
+        "intent_router": dict(router.stats, hit_rate=router.hit_rate()),
+        "http": pool_stats(),
+        "asi1": asi1.snapshot(),
+        "event_batching": toolset.stats(),
+        "payment_links": payment_links.snapshot(),
+        "outbox": outbox.snapshot(),
+        "response_cache": response_cache.stats,
+        "sessions": len(sessions),
+        "tool_result_encoding": dict(encoder.stats, saved=round(encoder.savings(), 3)),
+        "admission": admission.snapshot(),
+    }
+
+@agent.on_rest_get("/metrics", MetricsReport)
+async def get_metrics(ctx: Context):
+    return metrics.report(agent_counters())
+
+@agent.on_interval(period=CANISTER_STATS_INTERVAL)
+async def log_agent_stats(ctx: Context):
+    ctx.logger.info(f"Canister latency by mode: {canister.stats()}")
+    ctx.logger.info(f"Intent router hit rate {router.hit_rate():.1%}: {router.stats}")
+    ctx.logger.info(f"HTTP requests and collapsed duplicates: {pool_stats()}")
+    ctx.logger.info(f"Response cache: {response_cache.stats}")
+
+@agent.on_event("startup")
+async def load_sessions(ctx: Context):
+    await sessions.load()
+
+@agent.on_interval(period=SESSION_SAVE_INTERVAL)
+async def save_sessions(ctx: Context):
+    sessions.prune()
+    await sessions.save()
+
+@agent.on_rest_post("/payment-links/invalidate", PaymentLinkInvalidate, PaymentLinkInvalidated)
+async def invalidate_payment_links(ctx: Context, request: PaymentLinkInvalidate):
+    # Answers that quoted the link would otherwise keep serving it from the response cache
+    arguments = {"eventId": request.event_id} if request.event_id is not None else None
+    response_cache.invalidate("payment", arguments)
+    return PaymentLinkInvalidated(dropped=payment_links.invalidate(request.event_id))
+
+@agent.on_interval(period=PAYMENT_PREWARM_INTERVAL)
+async def prewarm_payment_links(ctx: Context):
+    try:
+        async with admission.scheduler.slot(BACKGROUND, "prewarm"):
+            loaded = await payment_links.prewarm()
+    except Exception as e:
+        ctx.logger.warning(f"Payment link prewarm failed: {e}")
+        return
+    if loaded:
+        ctx.logger.info(f"Prewarmed {loaded} payment links")
+
+@agent.on_interval(period=OUTBOX_FLUSH_INTERVAL)
+async def flush_outbox(ctx: Context):
+    try:
+        async with admission.scheduler.slot(BACKGROUND, "outbox"):
+            written = await outbox.flush()
+    except Exception as e:
+        ctx.logger.warning(f"Outbox flush failed: {e}")
+        return
+    await outbox.prune()
+    if written:
+        ctx.logger.info(f"Flushed {written} queued events")
+
+@agent.on_event("shutdown")
+async def close_http_pools(ctx: Context):
+    await close_pools()
+    await sessions.save()
+    await outbox.close()
+
 if __name__ == "__main__":
     agent.run()
 
@@ -7,15 +7,39 @@ from uagents_core.contrib.protocols.chat import (
 )
 from datetime import datetime, timezone
 from uuid import uuid4
+from routing import (
+    RoutingEngine, EVENT, PAYMENT, COORDINATOR_TIMEOUT, WORKER_HEALTH_INTERVAL, WORKER_PING_TIMEOUT
+)
+from metrics import metrics, MetricsReport
+from admission import AdmissionController, Rejected
+from typing import Optional
 
 class Request(Model):
     message: str
+    # Optional; rate limits are applied per client_id
+    client_id: Optional[str] = None
 
 class Response(Model):
     status: str
     message: str
+    retry_after: Optional[float] = None
 class Message(Model):
     message: str
+
+# Health check; workers answer with the number of queries they are processing
+class Ping(Model):
+    pass
+
+class Pong(Model):
+    inflight: int
+
+class WorkerUpdate(Model):
+    role: str
+    address: str
+    action: str  # "add", "drain" or "remove"
+
+class WorkerStatus(Model):
+    workers: dict
 # Coordinator Agent
 coordinator = Agent(
     name="Coordinator",
@@ -29,33 +53,86 @@ chat_proto = Protocol(spec=chat_protocol_spec)
 EVENT_AGENT_ADDR = "agent1qg7wm8zll4htp2sj4ktxuhvkktcwermhfx7939ag4av22uvwmrk82qhudsj"
 PAYMENT_AGENT_ADDR = "agent1q0kudz082w6ym5pvegfrc8rqkzk44a5seyz4nyul2z45xepz9atvxwv3esr"
 
+# Extra worker agents per role (comma separated); queries are spread across them
+EVENT_AGENT_ADDRS = [EVENT_AGENT_ADDR] + [a for a in os.getenv("EVENT_AGENT_REPLICAS", "").split(",") if a.strip()]
+PAYMENT_AGENT_ADDRS = [PAYMENT_AGENT_ADDR] + [a for a in os.getenv("PAYMENT_AGENT_REPLICAS", "").split(",") if a.strip()]
+
+router = RoutingEngine({EVENT: EVENT_AGENT_ADDRS, PAYMENT: PAYMENT_AGENT_ADDRS})
+admission = AdmissionController()
+
 @coordinator.on_rest_post("/chat", Request, Response)
 async def handle_chat(ctx: Context, request: Request):
     query = request.message.strip()
     ctx.logger.info(f"Incoming user request: {query}")
 
-    # Routing logic
-    if "payment" in query.lower() or "pay" in query.lower():
-        target = PAYMENT_AGENT_ADDR
+    async def ask(target: str):
+        ctx.logger.info(f"Routing query to {target}")
+        # Wait for reply from Event/Payment agent
+        with metrics.span("send_and_receive"):
+            reply, status = await ctx.send_and_receive(
+                target,
+                Message(message=query),
+                response_type=Message,
+                timeout=COORDINATOR_TIMEOUT,
+            )
+        if not isinstance(reply, Message):
+            metrics.error("send_and_receive")
+            return None, status
+        return reply.message, status
+
+    # Mixed queries go to both agents in parallel; the replies are merged
+    try:
+        # Anonymous callers only count against the global cap
+        async with admission.admit(request.client_id):
+            with metrics.span("dispatch"):
+                answer, statuses = await router.dispatch(query, ask)
+    except Rejected as e:
+        ctx.logger.warning(f"Rejected query: {e}")
+        return Response(status="rejected", message=str(e), retry_after=e.retry_after)
+
+    if answer is not None:
+        return Response(status="success", message=answer)
     else:
-        target = EVENT_AGENT_ADDR
+        return Response(status=str(statuses[0]), message="Reply contained no text")
 
-    ctx.logger.info(f"Routing query to {target}")
 
- 
+@coordinator.on_rest_get("/metrics", MetricsReport)
+async def get_metrics(ctx: Context):
+    return metrics.report({"routing": router.stats, "workers": router.snapshot(), "admission": admission.snapshot()})
 
-    # Wait for reply from Event/Payment agent
-    reply, status = await ctx.send_and_receive(
-        target,
-        Message(message=query),
-        response_type=Message,
-    )
 
+@coordinator.on_rest_get("/workers", WorkerStatus)
+async def list_workers(ctx: Context):
+    return WorkerStatus(workers=router.snapshot())
 
-    if isinstance(reply, Message):
-        return Response(status="success", message=reply.message)
-    else:
-        return Response(status=status, message="Reply contained no text")
+
+@coordinator.on_rest_post("/workers", WorkerUpdate, WorkerStatus)
+async def update_workers(ctx: Context, request: WorkerUpdate):
+    pool = router.pools.get(request.role)
+    if pool is not None:
+        if request.action == "add":
+            pool.add(request.address)
+        elif request.action == "drain":
+            pool.drain(request.address)
+        elif request.action == "remove":
+            pool.remove(request.address)
+        ctx.logger.info(f"Worker {request.action}: {request.role} {request.address}")
+    return WorkerStatus(workers=router.snapshot())
+
+
+@coordinator.on_interval(period=WORKER_HEALTH_INTERVAL)
+async def check_workers(ctx: Context):
+    async def ping(target: str):
+        reply, _ = await ctx.send_and_receive(target, Ping(), response_type=Pong, timeout=WORKER_PING_TIMEOUT)
+        return reply.inflight if isinstance(reply, Pong) else None
+
+    for address in await router.health_check(ping):
+        ctx.logger.warning(f"Removed unreachable worker {address}")
+
+
+@coordinator.on_interval(period=300.0)
+async def log_routing_stats(ctx: Context):
+    ctx.logger.info(f"Routing stats: {router.stats}")
 
 
 # Handle acknowledgements
@@ -1,190 +1,135 @@
 # agent_events.py
-import os, json, requests
+import os
 from uagents import Agent, Context, Model, Protocol
 from uagents_core.contrib.protocols.chat import (
     chat_protocol_spec, ChatMessage, ChatAcknowledgement, TextContent
 )
 from datetime import datetime, timezone
 from uuid import uuid4
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# ================= ICP BASE CONFIG =================
-BASE_URL = "http://127.0.0.1:4943"
-CANISTER_ID = "w7lou-c7777-77774-qaamq-cai"
-
-HEADERS = {
-    "Host": f"{CANISTER_ID}.localhost",
-    "Content-Type": "application/json",
-    "X-Ic-Force-Update": "true"
-}
-
-# ================= ASI1 CONFIG =================
-ASI1_API_KEY = os.getenv("ASI1_API_KEY")
-ASI1_BASE_URL = "https://api.asi1.ai/v1"
-ASI1_HEADERS = {
-    "Authorization": f"Bearer {ASI1_API_KEY}",
-    "Content-Type": "application/json"
-}
+from config import ASI1_BASE_URL, ASI1_HEADERS, CANISTER_BASE_URL, CANISTER_HEADERS
+from transport import asi1_pool, canister_pool, close_pools, pool_stats
+from canister import CanisterClient, CANISTER_STATS_INTERVAL
+from intent_router import IntentRouter, INTENT_ROUTER_DEGRADED_THRESHOLD
+from responses import template_response, uses_template, degraded_response, UNAVAILABLE_MESSAGE
+from encoding import ToolResultEncoder
+from tool_runner import run_tool_calls
+from metrics import metrics, MetricsReport
+from asi1 import ASI1Client, ASI1Unavailable
+from tool_registry import ToolSet
+from scheduler import Scheduler, CHAT, BACKGROUND
+from event_index import EventIndexRefresher, EVENT_INDEX_REFRESH
+from outbox import Outbox, OUTBOX_FLUSH_INTERVAL, outbox_path
+
+asi1 = ASI1Client(asi1_pool(ASI1_BASE_URL, ASI1_HEADERS))
+# Query vs forced-update mode is chosen per tool by the client
+canister = CanisterClient(canister_pool(CANISTER_BASE_URL, CANISTER_HEADERS))
+event_search = EventIndexRefresher(canister)
+encoder = ToolResultEncoder()
 
 # ================= EVENT AGENT =================
+# Run more workers behind the coordinator with a distinct name and port each
+AGENT_NAME = os.getenv("AGENT_NAME", "EventAgent")
+AGENT_PORT = int(os.getenv("AGENT_PORT", "8002"))
 event_agent = Agent(
-    name="EventAgent",
-    port=8002,
-    endpoint=['http://localhost:8002/submit'],
+    name=AGENT_NAME,
+    port=AGENT_PORT,
+    endpoint=[f'http://localhost:{AGENT_PORT}/submit'],
     mailbox=True
 )
 chat_proto = Protocol(spec=chat_protocol_spec)
 class Message(Model):
     message: str
+# Coordinator health check
+class Ping(Model):
+    pass
+class Pong(Model):
+    inflight: int
+inflight = 0
+SEARCH_FILTERS = {"text", "location", "min_price", "max_price", "date_from", "date_to",
+                  "available_only", "sort_by", "descending", "top_k"}
+router = IntentRouter({"get_events", "get_event_by_id", "canister_address"})
+
+async def search_events(args: dict):
+    # Served from the local index, no canister round-trip
+    filters = {k: v for k, v in args.items() if k in SEARCH_FILTERS and v is not None}
+    return {"events": await event_search.search(**filters)}
+
+scheduler = Scheduler()
+# Creates are written to a local outbox first and sent with an idempotency key
+outbox = Outbox(canister, outbox_path(AGENT_NAME))
 # Only include EVENT-related tools
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "create_event",
-            "description": "Create a new event in the ICP canister",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "name": {"type": "string"},
-                    "date": {"type": "string"},
-                    "location": {"type": "string"},
-                    "price": {"type": "string"},
-                    "capacity": {"type": "number"},
-                    "min_age": {"type": "number"}
-                },
-                "required": ["name", "date", "location", "price","capacity"],
-                "additionalProperties": False
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_events",
-            "description": "Get the list of events from the ICP canister",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "limit": {"type": "number"},
-                    "offset": {"type": "number"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_event_by_id",
-            "description": "Get details of a specific event by its ID",
-            "parameters": {
-                "type": "object",
-                "properties": {"eventId": {"type": "string"}},
-                "required": ["eventId"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "canister_address",
-            "description": "Returns the address of this canister",
-            "parameters": {"type": "object", "properties": {}}
-        }
-    }
-]
-
-# Call ICP endpoints for event functions
-async def call_event_endpoint(func_name: str, args: dict):
-    if func_name == "get_event_by_id":
-        url = f"{BASE_URL}/events/{args['eventId']}"
-        resp = requests.get(url, headers=HEADERS)
-    elif func_name == "get_events":
-        url = f"{BASE_URL}/events"
-        resp = requests.get(url, headers=HEADERS, params=args)
-    elif func_name == "create_event":
-        url = f"{BASE_URL}/events"
-        resp = requests.post(url, headers=HEADERS, json=args)
-    elif func_name == "canister_address":
-        url = f"{BASE_URL}/canister-address"
-        resp = requests.get(url, headers=HEADERS)
-    else:
-        raise ValueError("Unknown function")
-    resp.raise_for_status()
-    return resp.json()
+toolset = ToolSet(
+    ["create_event", "create_events_bulk", "get_events", "get_event_by_id", "get_events_by_ids", "canister_address",
+     "search_events"],
+    canister, handlers={"search_events": search_events, "create_event": outbox.handler}, encoder=encoder,
+    scheduler=scheduler,
+)
+
+async def execute_event_tool(func_name: str, arguments: dict, compact: bool = False) -> str:
+    result = await toolset.call(func_name, arguments)
+    # Keep the search index in step with everything we read or write by id
+    for event in toolset.records(func_name, result):
+        event_search.index.upsert(event)
+    return toolset.format(func_name, arguments, result, compact)
 
 # Main processor using ASI1 + tools
 async def process_event_query(query: str, ctx: Context) -> str:
     try:
-        # Step 1: Ask ASI1
-        payload = {
-            "model": "asi1-mini",
-            "messages": [{"role": "user", "content": query}],
-            "tools": tools,
-            "temperature": 0.7
-        }
-        response = requests.post(
-            f"{ASI1_BASE_URL}/chat/completions",
-            headers=ASI1_HEADERS,
-            json=payload
-        )
-        response.raise_for_status()
-        response_json = response.json()
-
-        tool_calls = response_json["choices"][0]["message"].get("tool_calls", [])
-        messages_history = [payload["messages"][0], response_json["choices"][0]["message"]]
+        # Step 1: Route plain commands locally, otherwise ask ASI1
+        user_message = {"role": "user", "content": query}
+        with metrics.span("intent"):
+            tool_calls, confidence = router.route(query)
+            if tool_calls:
+                ctx.logger.info(f"Intent router matched {tool_calls[0]['function']['name']} ({confidence:.2f})")
+                assistant_message = {"role": "assistant", "content": "", "tool_calls": tool_calls}
+            else:
+                payload = {
+                    "model": "asi1-mini",
+                    "messages": [user_message],
+                    "tools": toolset.schemas,
+                    "temperature": 0.7
+                }
+                try:
+                    response_json = await asi1.complete(payload)
+                except ASI1Unavailable as e:
+                    ctx.logger.warning(f"{e}, falling back to the intent router")
+                    tool_calls, confidence = router.route(query, INTENT_ROUTER_DEGRADED_THRESHOLD)
+                    if not tool_calls:
+                        return UNAVAILABLE_MESSAGE
+                    assistant_message = {"role": "assistant", "content": "", "tool_calls": tool_calls}
+                else:
+                    metrics.record_usage(response_json.get("usage"))
+                    assistant_message = response_json["choices"][0]["message"]
+                    tool_calls = assistant_message.get("tool_calls", [])
+        messages_history = [user_message, assistant_message]
 
         if not tool_calls:
             return "I couldn't figure out which event info you need."
 
         # Step 2: Execute tool calls
-        for tool_call in tool_calls:
-            func_name = tool_call["function"]["name"]
-            arguments = json.loads(tool_call["function"]["arguments"])
-            tool_call_id = tool_call["id"]
-
-            result = await call_event_endpoint(func_name, arguments)
-
-            if func_name == "get_events":
-                formatted = "\n".join([
-                    f"- {e.get('name')} | {e.get('date')} | {e.get('location')} | {e.get('price')} ETH"
-                    for e in result.get("events", [])
-                ])
-                content_to_send = formatted or "No events found."
-            elif func_name == "get_event_by_id":
-                e = result
-                content_to_send = (
-                    f"Event: {e.get('name')}\nDate: {e.get('date')}\n"
-                    f"Location: {e.get('location')}\nPrice: {e.get('price')} ETH"
-                )
-            elif func_name == "create_event":
-                content_to_send = f"✅ Event created: {result.get('name')} on {result.get('date')}"
-            elif func_name == "canister_address":
-                content_to_send = f"📦 Canister address: {result.get('address')}"
-            else:
-                content_to_send = json.dumps(result)
+        compact = asi1.available() and not uses_template(tool_calls)
+        tool_messages, failed = await run_tool_calls(
+            tool_calls, lambda func_name, arguments: execute_event_tool(func_name, arguments, compact)
+        )
+        messages_history.extend(tool_messages)
 
-            tool_result_message = {
-                "role": "tool",
-                "tool_call_id": tool_call_id,
-                "content": content_to_send
-            }
-            messages_history.append(tool_result_message)
+        answer = template_response(tool_calls, tool_messages, failed)
+        if answer is not None:
+            return answer
 
         # Step 3: Send back to ASI1 for final user-friendly reply
         final_payload = {
             "model": "asi1-mini",
             "messages": messages_history
         }
-        final_response = requests.post(
-            f"{ASI1_BASE_URL}/chat/completions",
-            headers=ASI1_HEADERS,
-            json=final_payload
-        )
-        final_response.raise_for_status()
-        return final_response.json()["choices"][0]["message"]["content"]
+        with metrics.span("final"):
+            try:
+                final_response_json = await asi1.complete(final_payload)
+            except ASI1Unavailable as e:
+                ctx.logger.warning(f"{e}, answering with the raw tool output")
+                return degraded_response(tool_messages)
+        metrics.record_usage(final_response_json.get("usage"))
+        return final_response_json["choices"][0]["message"]["content"]
 
     except Exception as e:
         ctx.logger.error(f"Error processing event query: {str(e)}")
@@ -197,7 +142,8 @@ async def handle_event_msg(ctx: Context, sender: str, msg: ChatMessage):
         if isinstance(item, TextContent):
             query = item.text
             ctx.logger.info(f"[EventAgent] Processing query: {query}")
-            reply = await process_event_query(query, ctx)
+            async with scheduler.slot(CHAT, sender):
+                reply = await process_event_query(query, ctx)
             response = ChatMessage(
                 timestamp=datetime.now(timezone.utc),
                 msg_id=uuid4(),
@@ -211,14 +157,75 @@ async def handle_ack(ctx: Context, sender: str, msg: ChatAcknowledgement):
 
 @event_agent.on_message(model=Message)
 async def handle_message(ctx: Context, sender: str, msg: Message):
+    global inflight
     ctx.logger.info(f"Received message from {sender}: {msg.message}")
     
     # langsung kirim ke query processor
-    reply = await process_event_query(msg.message, ctx)
+    inflight += 1
+    try:
+        async with scheduler.slot(CHAT, sender):
+            reply = await process_event_query(msg.message, ctx)
+    finally:
+        inflight -= 1
     
     await ctx.send(sender, Message(message=reply))
 
+@event_agent.on_message(model=Ping)
+async def handle_ping(ctx: Context, sender: str, msg: Ping):
+    await ctx.send(sender, Pong(inflight=inflight))
+
 event_agent.include(chat_proto)
 
+def agent_counters() -> dict:
+    return {
+        "canister": canister.stats(),
+        "intent_router": dict(router.stats, hit_rate=router.hit_rate()),
+        "http": pool_stats(),
+        "asi1": asi1.snapshot(),
+        "event_batching": toolset.stats(),
+        "event_index": {"events": len(event_search.index), "rebuilds": event_search.rebuilds,
+                        "updates": event_search.updates},
+        "tool_result_encoding": dict(encoder.stats, saved=round(encoder.savings(), 3)),
+        "scheduler": scheduler.snapshot(),
+        "outbox": outbox.snapshot(),
+    }
+
+@event_agent.on_rest_get("/metrics", MetricsReport)
+async def get_metrics(ctx: Context):
+    return metrics.report(agent_counters())
+
+@event_agent.on_interval(period=CANISTER_STATS_INTERVAL)
+async def log_agent_stats(ctx: Context):
+    ctx.logger.info(f"Canister latency by mode: {canister.stats()}")
+    ctx.logger.info(f"Intent router hit rate {router.hit_rate():.1%}: {router.stats}")
+    ctx.logger.info(f"HTTP requests and collapsed duplicates: {pool_stats()}")
+
+@event_agent.on_interval(period=EVENT_INDEX_REFRESH)
+async def refresh_event_index(ctx: Context):
+    try:
+        async with scheduler.slot(BACKGROUND, "event_index"):
+            changed = await event_search.refresh()
+        if changed:
+            ctx.logger.info(f"Event index updated, {len(event_search.index)} events")
+    except Exception as e:
+        ctx.logger.error(f"Event index refresh failed: {str(e)}")
+
+@event_agent.on_interval(period=OUTBOX_FLUSH_INTERVAL)
+async def flush_outbox(ctx: Context):
+    try:
+        async with scheduler.slot(BACKGROUND, "outbox"):
+            written = await outbox.flush()
+    except Exception as e:
+        ctx.logger.warning(f"Outbox flush failed: {e}")
+        return
+    await outbox.prune()
+    if written:
+        ctx.logger.info(f"Flushed {written} queued events")
+
+@event_agent.on_event("shutdown")
+async def close_http_pools(ctx: Context):
+    await close_pools()
+    await outbox.close()
+
 if __name__ == "__main__":
     event_agent.run()
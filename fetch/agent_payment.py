@@ -1,118 +1,105 @@
 # agent_payment.py
-import os, json, requests
+import os
+from typing import Optional
 from uagents import Agent, Context,Model, Protocol
 from uagents_core.contrib.protocols.chat import (
     chat_protocol_spec, ChatMessage, TextContent,ChatAcknowledgement
 )
 from datetime import datetime, timezone
 from uuid import uuid4
-from dotenv import load_dotenv
+from config import ASI1_BASE_URL, ASI1_HEADERS, CANISTER_BASE_URL, CANISTER_HEADERS
+from transport import asi1_pool, canister_pool, close_pools, pool_stats
+from canister import CanisterClient, CANISTER_STATS_INTERVAL
+from intent_router import IntentRouter, INTENT_ROUTER_DEGRADED_THRESHOLD
+from responses import template_response, degraded_response, UNAVAILABLE_MESSAGE
+from tool_runner import run_tool_calls
+from metrics import metrics, MetricsReport
+from asi1 import ASI1Client, ASI1Unavailable
+from tool_registry import ToolSet
+from scheduler import Scheduler, CHAT, BACKGROUND
+from payment_links import PaymentLinkCache, PAYMENT_PREWARM_INTERVAL
 
-load_dotenv()
-BASE_URL = "http://127.0.0.1:4943"
-CANISTER_ID = "w7lou-c7777-77774-qaamq-cai"
 class Message(Model):
     message: str
-HEADERS = {
-    "Host": f"{CANISTER_ID}.localhost",
-    "Content-Type": "application/json",
-    "X-Ic-Force-Update": "true"
-}
-# ================= ASI1 CONFIG =================
-ASI1_API_KEY = os.getenv("ASI1_API_KEY")
-ASI1_BASE_URL = "https://api.asi1.ai/v1"
-ASI1_HEADERS = {
-    "Authorization": f"Bearer {ASI1_API_KEY}",
-    "Content-Type": "application/json"
-}
-tools=[
-      {
-    "type": "function",
-    "function": {
-        "name": "payment",
-        "description": "Returns the payment link for a given event",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "eventId": {
-                    "type": "string",
-                    "description": "ID of the event to pay for"
-                }
-            },
-            "required": ["eventId"],
-            "additionalProperties": False
-        },
-        "strict": True
-    }
-}
-
-]
-payment_agent = Agent(name="PaymentAgent", port=8003,endpoint = ['http://localhost:8003/submit'], mailbox=True)
+# Coordinator health check
+class Ping(Model):
+    pass
+class Pong(Model):
+    inflight: int
+class PaymentLinkInvalidate(Model):
+    # Omit to drop every cached link
+    event_id: Optional[str] = None
+class PaymentLinkInvalidated(Model):
+    dropped: int
+inflight = 0
+asi1 = ASI1Client(asi1_pool(ASI1_BASE_URL, ASI1_HEADERS))
+# Query vs forced-update mode is chosen per tool by the client
+canister = CanisterClient(canister_pool(CANISTER_BASE_URL, CANISTER_HEADERS))
+payment_links = PaymentLinkCache(canister)
+scheduler = Scheduler()
+toolset = ToolSet(["payment"], canister, handlers={"payment": payment_links.handler}, scheduler=scheduler)
+router = IntentRouter({"payment"})
+# Run more workers behind the coordinator with a distinct name and port each
+AGENT_NAME = os.getenv("AGENT_NAME", "PaymentAgent")
+AGENT_PORT = int(os.getenv("AGENT_PORT", "8003"))
+payment_agent = Agent(name=AGENT_NAME, port=AGENT_PORT,endpoint = [f'http://localhost:{AGENT_PORT}/submit'], mailbox=True)
 chat_proto = Protocol(spec=chat_protocol_spec)
 
-async def call_payment_endpoint(func_name: str, args: dict):
-    if func_name == "payment":
-        event_id = args.get("eventId")
-        url = f"{BASE_URL}/payment/{event_id}"
-        resp = requests.get(url, headers=HEADERS, json={})
-    resp.raise_for_status()
-    return resp.json()
 # Main processor using ASI1 + tools
 async def process_event_query(query: str, ctx: Context) -> str:
     try:
-        # Step 1: Ask ASI1
-        payload = {
-            "model": "asi1-mini",
-            "messages": [{"role": "user", "content": query}],
-            "tools": tools,
-            "temperature": 0.7
-        }
-        response = requests.post(
-            f"{ASI1_BASE_URL}/chat/completions",
-            headers=ASI1_HEADERS,
-            json=payload
-        )
-        response.raise_for_status()
-        response_json = response.json()
-
-        tool_calls = response_json["choices"][0]["message"].get("tool_calls", [])
-        messages_history = [payload["messages"][0], response_json["choices"][0]["message"]]
+        # Step 1: Route plain commands locally, otherwise ask ASI1
+        user_message = {"role": "user", "content": query}
+        with metrics.span("intent"):
+            tool_calls, confidence = router.route(query)
+            if tool_calls:
+                ctx.logger.info(f"Intent router matched {tool_calls[0]['function']['name']} ({confidence:.2f})")
+                assistant_message = {"role": "assistant", "content": "", "tool_calls": tool_calls}
+            else:
+                payload = {
+                    "model": "asi1-mini",
+                    "messages": [user_message],
+                    "tools": toolset.schemas,
+                    "temperature": 0.7
+                }
+                try:
+                    response_json = await asi1.complete(payload)
+                except ASI1Unavailable as e:
+                    ctx.logger.warning(f"{e}, falling back to the intent router")
+                    tool_calls, confidence = router.route(query, INTENT_ROUTER_DEGRADED_THRESHOLD)
+                    if not tool_calls:
+                        return UNAVAILABLE_MESSAGE
+                    assistant_message = {"role": "assistant", "content": "", "tool_calls": tool_calls}
+                else:
+                    metrics.record_usage(response_json.get("usage"))
+                    assistant_message = response_json["choices"][0]["message"]
+                    tool_calls = assistant_message.get("tool_calls", [])
+        messages_history = [user_message, assistant_message]
 
         if not tool_calls:
             return "I couldn't figure out which payment info you need."
 
         # Step 2: Execute tool calls
-        for tool_call in tool_calls:
-            func_name = tool_call["function"]["name"]
-            arguments = json.loads(tool_call["function"]["arguments"])
-            tool_call_id = tool_call["id"]
-
-            result = await call_payment_endpoint(func_name, arguments)
-
-            if func_name == "payment":
-                    content_to_send = f"💳 Payment link for event {arguments.get('eventId')}: {result.get('paymentLink')}"
-            else:
-                content_to_send = json.dumps(result)
+        tool_messages, failed = await run_tool_calls(tool_calls, toolset.execute)
+        messages_history.extend(tool_messages)
 
-            tool_result_message = {
-                "role": "tool",
-                "tool_call_id": tool_call_id,
-                "content": content_to_send
-            }
-            messages_history.append(tool_result_message)
+        answer = template_response(tool_calls, tool_messages, failed)
+        if answer is not None:
+            return answer
 
         # Step 3: Send back to ASI1 for final user-friendly reply
         final_payload = {
             "model": "asi1-mini",
             "messages": messages_history
         }
-        final_response = requests.post(
-            f"{ASI1_BASE_URL}/chat/completions",
-            headers=ASI1_HEADERS,
-            json=final_payload
-        )
-        final_response.raise_for_status()
-        return final_response.json()["choices"][0]["message"]["content"]
+        with metrics.span("final"):
+            try:
+                final_response_json = await asi1.complete(final_payload)
+            except ASI1Unavailable as e:
+                ctx.logger.warning(f"{e}, answering with the raw tool output")
+                return degraded_response(tool_messages)
+        metrics.record_usage(final_response_json.get("usage"))
+        return final_response_json["choices"][0]["message"]["content"]
 
     except Exception as e:
         ctx.logger.error(f"Error processing event query: {str(e)}")
@@ -127,7 +114,8 @@ async def handle_event_msg(ctx: Context, sender: str, msg: ChatMessage):
         if isinstance(item, TextContent):
             query = item.text
             ctx.logger.info(f"[EventAgent] Processing query: {query}")
-            reply = await process_event_query(query, ctx)
+            async with scheduler.slot(CHAT, sender):
+                reply = await process_event_query(query, ctx)
             response = ChatMessage(
                 timestamp=datetime.now(timezone.utc),
                 msg_id=uuid4(),
@@ -136,13 +124,62 @@ async def handle_event_msg(ctx: Context, sender: str, msg: ChatMessage):
             await ctx.send(sender, response)
 @payment_agent.on_message(model=Message)
 async def handle_message(ctx: Context, sender: str, msg: Message):
+    global inflight
     ctx.logger.info(f"Received message from {sender}: {msg.message}")
     
     # langsung kirim ke query processor
-    reply = await process_event_query(msg.message, ctx)
+    inflight += 1
+    try:
+        async with scheduler.slot(CHAT, sender):
+            reply = await process_event_query(msg.message, ctx)
+    finally:
+        inflight -= 1
     
     await ctx.send(sender, Message(message=reply))
+
+@payment_agent.on_message(model=Ping)
+async def handle_ping(ctx: Context, sender: str, msg: Ping):
+    await ctx.send(sender, Pong(inflight=inflight))
 payment_agent.include(chat_proto)
 
+def agent_counters() -> dict:
+    return {
+        "canister": canister.stats(),
+        "intent_router": dict(router.stats, hit_rate=router.hit_rate()),
+        "http": pool_stats(),
+        "asi1": asi1.snapshot(),
+        "payment_links": payment_links.snapshot(),
+        "scheduler": scheduler.snapshot(),
+    }
+
+@payment_agent.on_rest_get("/metrics", MetricsReport)
+async def get_metrics(ctx: Context):
+    return metrics.report(agent_counters())
+
+@payment_agent.on_interval(period=CANISTER_STATS_INTERVAL)
+async def log_agent_stats(ctx: Context):
+    ctx.logger.info(f"Canister latency by mode: {canister.stats()}")
+    ctx.logger.info(f"Intent router hit rate {router.hit_rate():.1%}: {router.stats}")
+    ctx.logger.info(f"HTTP requests and collapsed duplicates: {pool_stats()}")
+
+@payment_agent.on_rest_post("/payment-links/invalidate", PaymentLinkInvalidate, PaymentLinkInvalidated)
+async def invalidate_payment_links(ctx: Context, request: PaymentLinkInvalidate):
+    return PaymentLinkInvalidated(dropped=payment_links.invalidate(request.event_id))
+
+@payment_agent.on_interval(period=PAYMENT_PREWARM_INTERVAL)
+async def prewarm_payment_links(ctx: Context):
+    try:
+        async with scheduler.slot(BACKGROUND, "prewarm"):
+            loaded = await payment_links.prewarm()
+    except Exception as e:
+        ctx.logger.warning(f"Payment link prewarm failed: {e}")
+        return
+    if loaded:
+        ctx.logger.info(f"Prewarmed {loaded} payment links")
+
+@payment_agent.on_event("shutdown")
+async def close_http_pools(ctx: Context):
+    await close_pools()
+
 if __name__ == "__main__":
     payment_agent.run()
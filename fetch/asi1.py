@@ -0,0 +1,197 @@
+# asi1.py
+import os
+import time
+import random
+import asyncio
+import aiohttp
+from transport import HttpPool
+
+ASI1_RETRIES = int(os.getenv("ASI1_RETRIES", "3"))
+ASI1_BACKOFF = float(os.getenv("ASI1_BACKOFF", "0.5"))
+ASI1_BACKOFF_MAX = float(os.getenv("ASI1_BACKOFF_MAX", "8"))
+# Longest Retry-After we are willing to sleep through inside one query
+ASI1_MAX_RETRY_AFTER = float(os.getenv("ASI1_MAX_RETRY_AFTER", "20"))
+# Consecutive failed calls that open the breaker, and how long it stays open before a probe
+ASI1_BREAKER_THRESHOLD = int(os.getenv("ASI1_BREAKER_THRESHOLD", "5"))
+ASI1_BREAKER_RESET = float(os.getenv("ASI1_BREAKER_RESET", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ASI1Unavailable(Exception):
+    """ASI1 failed after retries, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and fails fast for ``reset_timeout`` seconds.
+
+    Then one probe call is let through (half-open). Success closes the
+    breaker, failure opens it again. A probe that ends without an outcome
+    (cancelled) is ``abandon``-ed, and one that never reports back is
+    replaced after another ``reset_timeout``, so the breaker cannot stay
+    half-open for good.
+    """
+
+    def __init__(self, threshold: int = ASI1_BREAKER_THRESHOLD, reset_timeout: float = ASI1_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+        self.opens = 0
+
+    def available(self) -> bool:
+        """Whether a call would be let through right now, without claiming the probe."""
+        return self.state == CLOSED or self._probe_due()
+
+    def allow(self) -> bool:
+        if self._probe_due():
+            self.state = HALF_OPEN
+            self.probe_at = time.monotonic()
+            return True
+        return self.state == CLOSED
+
+    def abandon(self):
+        """The probe ended without an outcome; the next call probes again."""
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+            self.opened_at = time.monotonic() - self.reset_timeout
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            if self.state != OPEN:
+                self.opens += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def _probe_due(self) -> bool:
+        now = time.monotonic()
+        if self.state == OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        return self.state == HALF_OPEN and now - self.probe_at >= self.reset_timeout
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """Seconds to wait before retry ``attempt``: Retry-After if the server sent one, else full-jitter backoff."""
+    headers = getattr(error, "headers", None) or {}
+    retry_after = headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), ASI1_MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return random.uniform(0, min(ASI1_BACKOFF_MAX, ASI1_BACKOFF * 2 ** attempt))
+
+
+def retryable(error: Exception) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRY_STATUSES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def upstream_failure(error: Exception) -> bool:
+    """Whether ``error`` says ASI1 itself is failing, rather than refusing this one request (400, 413, 422...)."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class ASI1Client:
+    """Chat completions with retries and a circuit breaker in front of the ASI1 pool.
+
+    429 and 5xx responses, connection errors and timeouts are retried with
+    jittered exponential backoff, honoring ``Retry-After``. When those still
+    fail they count against the breaker and raise ``ASI1Unavailable``; any
+    other error, such as a 400 for one user's prompt, is raised unchanged
+    and leaves the breaker alone. While the breaker is
+    open, calls raise ``ASI1Unavailable`` at once, so callers can answer from
+    the intent router and templates instead of queueing on a dead upstream.
+    """
+
+    def __init__(self, pool: HttpPool, retries: int = ASI1_RETRIES, breaker: CircuitBreaker = None):
+        self.pool = pool
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "short_circuited": 0}
+
+    def available(self) -> bool:
+        return self.breaker.available()
+
+    async def complete(self, payload: dict) -> dict:
+        probe = self._admit()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    result = await self.pool.post("/chat/completions", json=payload)
+                except Exception as e:
+                    await self._failed(attempt, e)
+                    continue
+                self.breaker.success()
+                return result
+        except asyncio.CancelledError:
+            if probe:
+                self.breaker.abandon()
+            raise
+
+    async def stream(self, payload: dict):
+        """Yield streamed completion events; retries only until the first event arrives."""
+        probe = self._admit()
+        try:
+            for attempt in range(self.retries + 1):
+                started = False
+                try:
+                    async for event in self.pool.stream("POST", "/chat/completions", json=payload):
+                        started = True
+                        yield event
+                except Exception as e:
+                    if started:
+                        if upstream_failure(e):
+                            self.breaker.failure()
+                        raise
+                    await self._failed(attempt, e)
+                    continue
+                self.breaker.success()
+                return
+        except (asyncio.CancelledError, GeneratorExit):
+            # Cancelled, or the reader stopped early
+            if probe:
+                self.breaker.abandon()
+            raise
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, breaker=self.breaker.state, breaker_opens=self.breaker.opens)
+
+    def _admit(self) -> bool:
+        """Raise ``ASI1Unavailable`` if the breaker is open; returns whether this call is the half-open probe."""
+        self.stats["calls"] += 1
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise ASI1Unavailable("ASI1 is unavailable (circuit open)")
+        return self.breaker.state == HALF_OPEN
+
+    async def _failed(self, attempt: int, error: Exception):
+        if not upstream_failure(error):
+            if isinstance(error, aiohttp.ClientResponseError):
+                # ASI1 answered, it only refused this request
+                self.breaker.success()
+            else:
+                self.breaker.abandon()
+            raise error
+        # A half-open probe gets a single attempt
+        if attempt < self.retries and retryable(error) and self.breaker.state == CLOSED:
+            self.stats["retries"] += 1
+            await asyncio.sleep(retry_delay(attempt, error))
+            return
+        self.stats["failures"] += 1
+        self.breaker.failure()
+        raise ASI1Unavailable(f"ASI1 request failed: {error}") from error
@@ -0,0 +1,468 @@
+# bench.py
+"""Load test the agents against local stand-ins for ASI1 and the canister.
+
+    python bench.py mocks                      # only serve the mocks
+    python bench.py run --target agent --transport rest -c 32 -n 1000
+    python bench.py run --target coordinator --transport protocol --asi1-latency 0.5
+
+``rest`` starts ``agent.py`` as a subprocess and posts to its ``/chat`` route.
+``protocol`` imports the target module and drives its message handler in this
+process: the chat protocol handler for ``agent``, the ``Message`` handler for
+``events`` and ``payment``, and ``handle_chat`` for ``coordinator``. For the
+coordinator, sub-agent replies are served by the worker modules in-process,
+since agents cannot resolve each other without the Almanac.
+
+Reports throughput, latency percentiles and ASI1/canister calls per query.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from uuid import uuid4
+from datetime import datetime, timezone
+import aiohttp
+from aiohttp import web
+
+# "{id}" is replaced by a random event id per query, so caches see realistic variety
+DEFAULT_QUERIES = [
+    "list events",
+    "list events limit {id}",
+    "show event {id}",
+    "get event {id}",
+    "pay for event {id}",
+    "payment link for event {id}",
+    "what is the canister address",
+    "show events {id}, {id} and {id}",
+    "which events are worth going to this month?",
+    "tell me something fun about event {id}",
+]
+
+
+# ================= MOCK SERVERS =================
+
+class Mocks:
+    """Mock canister HTTP gateway and ASI1 chat completions API on one aiohttp app.
+
+    ASI1 replies with scripted tool calls: every number in the user message
+    becomes a ``get_event_by_id`` call (``payment`` if the message mentions
+    paying), anything else becomes ``get_events``. Turns that already carry
+    tool results get a final answer, streamed when ``stream`` is set.
+    """
+
+    def __init__(self, events: int = 200, asi1_latency: float = 0.3, canister_latency: float = 0.02):
+        self.asi1_latency = asi1_latency
+        self.canister_latency = canister_latency
+        self.events = [
+            {
+                "id": i,
+                "name": f"Event {i}",
+                "date": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                "location": random.choice(["Jakarta", "Bali", "Bandung", "Surabaya"]),
+                "price": f"{0.01 * (i % 50):.2f}",
+                "capacity": 100,
+                "booked_count": i % 100,
+                "min_age": 18,
+                # The canister joins the organizer into every event row
+                "user": {"id": i, "username": f"organizer{uuid4()}", "age": 30},
+            }
+            for i in range(1, events + 1)
+        ]
+        self.calls = {"asi1": 0, "canister": 0}
+        self.keys = {}
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get("/events", self.list_events),
+            web.post("/events", self.create_event),
+            web.get("/events/count", self.count_events),
+            web.post("/events/bulk", self.create_events_bulk),
+            web.get("/events/by-ids", self.get_events_by_ids),
+            web.get("/events/changes", self.event_changes),
+            web.get("/events/{id}", self.get_event),
+            web.get("/payment/{id}", self.payment),
+            web.get("/canister-address", self.canister_address),
+            web.post("/v1/chat/completions", self.chat_completions),
+            web.get("/__stats", self.stats),
+        ])
+        self._runner = None
+
+    async def start(self, port: int):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _canister(self):
+        self.calls["canister"] += 1
+        await asyncio.sleep(self.canister_latency)
+
+    async def list_events(self, request):
+        await self._canister()
+        limit = int(request.query.get("limit", 100))
+        offset = int(request.query.get("offset", 0))
+        return web.json_response(self.events[offset:offset + limit])
+
+    async def count_events(self, request):
+        await self._canister()
+        return web.json_response(len(self.events))
+
+    async def get_event(self, request):
+        # Like the canister: 200 with null for unknown or malformed IDs
+        await self._canister()
+        event_id = request.match_info["id"]
+        return web.json_response(next((e for e in self.events if str(e["id"]) == event_id), None))
+
+    async def get_events_by_ids(self, request):
+        await self._canister()
+        by_id = {str(e["id"]): e for e in self.events}
+        return web.json_response([by_id.get(i) for i in request.query.get("ids", "").split(",")])
+
+    async def event_changes(self, request):
+        # Events are never edited here, so an event's revision is its id
+        await self._canister()
+        since = int(request.query.get("since", 0))
+        changed = [e for e in self.events if e["id"] > since][:int(request.query.get("limit", 100))]
+        revision = changed[-1]["id"] if changed else max(since, len(self.events))
+        return web.json_response({"events": changed, "revision": revision})
+
+    async def create_event(self, request):
+        await self._canister()
+        return web.json_response(self._create(await request.json()))
+
+    async def create_events_bulk(self, request):
+        await self._canister()
+        results = [
+            {"index": index, "success": True, "event": self._create(item)}
+            for index, item in enumerate((await request.json()).get("events", []))
+        ]
+        return web.json_response({"created": len(results), "failed": 0, "results": results})
+
+    def _create(self, item: dict) -> dict:
+        # Like the canister, a repeated idempotency key returns the event created first
+        key = item.pop("idempotency_key", None)
+        if key in self.keys:
+            return self.keys[key]
+        event = dict(item, id=len(self.events) + 1, booked_count=0,
+                     user={"id": len(self.events) + 1, "username": f"organizer{uuid4()}", "age": 30})
+        self.events.append(event)
+        if key is not None:
+            self.keys[key] = event
+        return event
+
+    async def payment(self, request):
+        await self._canister()
+        return web.json_response({"success": True, "paymentLink": f"https://pay.example/{request.match_info['id']}"})
+
+    async def canister_address(self, request):
+        await self._canister()
+        return web.json_response({"address": "bench-canister"})
+
+    async def stats(self, request):
+        return web.json_response(self.calls)
+
+    async def chat_completions(self, request):
+        self.calls["asi1"] += 1
+        body = await request.json()
+        await asyncio.sleep(self.asi1_latency)
+        messages = body["messages"]
+        usage = {"prompt_tokens": 40 * len(messages), "completion_tokens": 20}
+        if messages[-1]["role"] == "user" and body.get("tools"):
+            names = {tool["function"]["name"] for tool in body["tools"]}
+            message = {"role": "assistant", "content": "", "tool_calls": self._tool_calls(messages[-1]["content"], names)}
+            return web.json_response({"choices": [{"message": message}], "usage": usage})
+
+        text = "Here is what I found:\n" + "\n".join(m["content"] for m in messages if m["role"] == "tool")
+        if not body.get("stream"):
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": text}}], "usage": usage})
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for start in range(0, len(text), 16):
+            chunk = {"choices": [{"delta": {"content": text[start:start + 16]}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    def _tool_calls(self, query: str, names: set) -> list:
+        ids = re.findall(r"\d+", query)
+        if ids and re.search(r"\bpay", query, re.IGNORECASE) and "payment" in names:
+            name = "payment"
+        elif ids and "get_event_by_id" in names:
+            name = "get_event_by_id"
+        elif "get_events" in names:
+            name, ids = "get_events", [None]
+        else:
+            name, ids = sorted(names)[0], [None]
+        return [
+            {
+                "id": f"call_{uuid4().hex[:8]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps({"eventId": i} if i else {})},
+            }
+            for i in ids
+        ]
+
+
+# ================= LOAD DRIVERS =================
+
+class BenchLogger:
+    def info(self, *args):
+        pass
+
+    debug = warning = info
+
+    def error(self, *args):
+        print("agent error:", *args, file=sys.stderr)
+
+
+class BenchContext:
+    """Just enough of ``uagents.Context`` for the message handlers.
+
+    ``send`` records when the first reply content leaves the agent; with
+    ``peers`` set, ``send_and_receive`` hands the message to that address's
+    handler in this process and returns what it sends back.
+    """
+
+    def __init__(self, peers: dict = None):
+        self.logger = BenchLogger()
+        self.peers = peers or {}
+        self.first_reply = None
+
+    async def send(self, destination: str, message):
+        if self.first_reply is None and type(message).__name__ != "ChatAcknowledgement":
+            self.first_reply = time.perf_counter()
+
+    async def send_and_receive(self, destination: str, message, response_type, timeout: int = 30):
+        handler = self.peers.get(destination)
+        if handler is None:
+            return None, "unknown destination"
+        peer = _PeerContext(self.peers)
+        await asyncio.wait_for(handler(peer, "bench", message), timeout)
+        # Each agent module declares its own copy of the model; match on the schema like uagents does
+        replies = [response_type.parse_raw(m.json()) for m in peer.outbox if type(m).__name__ == response_type.__name__]
+        return (replies[0] if replies else None), "delivered"
+
+
+class _PeerContext(BenchContext):
+    """Context given to a peer handler; collects what it sends back."""
+
+    def __init__(self, peers: dict):
+        super().__init__(peers)
+        self.outbox = []
+
+    async def send(self, destination: str, message):
+        self.outbox.append(message)
+
+
+def render(query: str, event_ids: int) -> str:
+    return re.sub(r"\{id\}", lambda _: str(random.randint(1, event_ids)), query)
+
+
+def percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def drive(query_once, queries: list, concurrency: int, total: int, event_ids: int) -> dict:
+    """Run ``total`` queries with ``concurrency`` in flight; ``query_once`` returns first-reply seconds or None."""
+    latencies, first_replies, errors = [], [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                first = await query_once(render(queries[i % len(queries)], event_ids))
+            except Exception as e:
+                errors += 1
+                print("query error:", e, file=sys.stderr)
+                continue
+            latencies.append(time.perf_counter() - started)
+            if first is not None:
+                first_replies.append(first - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    first_replies.sort()
+    report = {
+        "queries": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_qps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    for name, samples in (("latency", latencies), ("first_reply", first_replies)):
+        if samples:
+            for q in (0.5, 0.95, 0.99):
+                report[f"{name}_p{int(q * 100)}_ms"] = round(percentile(samples, q) * 1000, 1)
+            report[f"{name}_max_ms"] = round(samples[-1] * 1000, 1)
+    return report
+
+
+async def rest_target(args, env: dict):
+    """Start ``agent.py`` with the mocks' URLs and return a query function for its ``/chat`` route."""
+    process = subprocess.Popen(
+        [sys.executable, "agent.py"], cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, **env},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.agent_port}/chat"
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency))
+    for _ in range(100):
+        try:
+            async with session.post(url, json={"message": "list events"}) as resp:
+                if resp.status == 200:
+                    break
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    else:
+        process.terminate()
+        await session.close()
+        raise RuntimeError("agent.py did not start serving /chat")
+
+    async def query_once(query: str):
+        async with session.post(url, json={"message": query}) as resp:
+            resp.raise_for_status()
+            await resp.json()
+        return None
+
+    async def stop():
+        await session.close()
+        process.terminate()
+        process.wait()
+
+    return query_once, stop
+
+
+def protocol_target(args):
+    """Import the target module and return a query function that drives its message handler."""
+    if args.target == "agent":
+        import agent
+        from uagents_core.contrib.protocols.chat import ChatMessage, TextContent
+
+        async def query_once(query: str):
+            ctx = BenchContext()
+            msg = ChatMessage(timestamp=datetime.now(timezone.utc), msg_id=uuid4(),
+                              content=[TextContent(type="text", text=query)])
+            # The chat protocol handler; the REST handler above it has the same name
+            await agent.handle_chat_message(ctx, f"bench-{uuid4().hex}", msg)
+            return ctx.first_reply
+        return query_once
+
+    import agent_events
+    import agent_payment
+    if args.target in ("events", "payment"):
+        module = agent_events if args.target == "events" else agent_payment
+
+        async def query_once(query: str):
+            ctx = BenchContext()
+            await module.handle_message(ctx, "bench", module.Message(message=query))
+            return ctx.first_reply
+        return query_once
+
+    import agent_coordinator as coordinator
+    peers = {}
+    for role, module in (("event", agent_events), ("payment", agent_payment)):
+        for address in coordinator.router.pools[role].workers:
+            peers[address] = lambda ctx, sender, msg, module=module: module.handle_message(
+                ctx, sender, module.Message.parse_raw(msg.json())
+            )
+
+    async def query_once(query: str):
+        response = await coordinator.handle_chat(BenchContext(peers), coordinator.Request(message=query))
+        if response.status != "success":
+            raise RuntimeError(response.message)
+        return None
+    return query_once
+
+
+async def fetch_calls(port: int) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{port}/__stats") as resp:
+            return await resp.json()
+
+
+async def run(args):
+    mocks = Mocks(args.events, args.asi1_latency, args.canister_latency)
+    await mocks.start(args.mock_port)
+    env = {
+        "ASI1_BASE_URL": f"http://127.0.0.1:{args.mock_port}/v1",
+        "CANISTER_BASE_URL": f"http://127.0.0.1:{args.mock_port}",
+        "ASI1_API_KEY": "bench",
+    }
+    stop = None
+    try:
+        if args.transport == "rest":
+            if args.target != "agent":
+                raise SystemExit("rest transport is only available for --target agent")
+            query_once, stop = await rest_target(args, env)
+        else:
+            os.environ.update(env)
+            query_once = protocol_target(args)
+
+        queries = DEFAULT_QUERIES
+        if args.queries:
+            with open(args.queries) as f:
+                queries = [line.strip() for line in f if line.strip()]
+
+        for query in queries[:args.warmup]:
+            await query_once(render(query, args.events))
+        before = await fetch_calls(args.mock_port)
+        report = await drive(query_once, queries, args.concurrency, args.requests, args.events)
+        after = await fetch_calls(args.mock_port)
+        done = max(1, report["queries"])
+        report["asi1_calls_per_query"] = round((after["asi1"] - before["asi1"]) / done, 3)
+        report["canister_calls_per_query"] = round((after["canister"] - before["canister"]) / done, 3)
+        report = {"target": args.target, "transport": args.transport, "concurrency": args.concurrency, **report}
+    finally:
+        if stop is not None:
+            await stop()
+        if args.transport == "protocol":
+            from transport import close_pools
+            await close_pools()
+        await mocks.stop()
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        width = max(len(key) for key in report)
+        for key, value in report.items():
+            print(f"{key:<{width}}  {value}")
+
+
+async def serve_mocks(args):
+    mocks = Mocks(args.events, args.asi1_latency, args.canister_latency)
+    await mocks.start(args.mock_port)
+    print(f"Mock ASI1 at http://127.0.0.1:{args.mock_port}/v1, canister at http://127.0.0.1:{args.mock_port}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "mocks"])
+    parser.add_argument("--target", choices=["agent", "events", "payment", "coordinator"], default="agent")
+    parser.add_argument("--transport", choices=["rest", "protocol"], default="protocol")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-n", "--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=len(DEFAULT_QUERIES), help="queries sent before measuring")
+    parser.add_argument("--queries", help="file with one query per line instead of the built-in mix")
+    parser.add_argument("--asi1-latency", type=float, default=0.3, help="seconds per mock ASI1 completion")
+    parser.add_argument("--canister-latency", type=float, default=0.02, help="seconds per mock canister call")
+    parser.add_argument("--events", type=int, default=200, help="events in the mock canister")
+    parser.add_argument("--mock-port", type=int, default=4950)
+    parser.add_argument("--agent-port", type=int, default=8001, help="REST port of agent.py")
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    args = parser.parse_args()
+    asyncio.run(run(args) if args.command == "run" else serve_mocks(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# cache.py
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+EVENT_CACHE_SIZE = int(os.getenv("EVENT_CACHE_SIZE", "1024"))
+EVENT_CACHE_TTL = float(os.getenv("EVENT_CACHE_TTL", "30"))
+EVENT_CACHE_STALE_TTL = float(os.getenv("EVENT_CACHE_STALE_TTL", "300"))
+
+
+def key_part(value):
+    """Canonical form of a tool argument inside a cache key.
+
+    Models send the same argument as ``10``, ``10.0`` or ``"10"``; all of
+    them become ``"10"``. Other strings are stripped, lists and dicts are
+    normalized item by item, and None stays None.
+    """
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [key_part(item) for item in value]
+    if isinstance(value, dict):
+        return {str(k): key_part(v) for k, v in value.items()}
+    text = str(value).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+class TTLCache:
+    """LRU-bounded in-process cache with a fresh and a stale-but-acceptable window.
+
+    Entries younger than ``ttl`` are served as-is. Entries between ``ttl`` and
+    ``ttl + stale_ttl`` are still served, but trigger a background
+    revalidation. Older entries are treated as a miss.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30, stale_ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.generation = 0
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._refreshing = {}
+
+    def get(self, key):
+        """Return ``(status, value)`` where status is ``fresh``, ``stale`` or ``miss``."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return "miss", None
+        stored_at, value = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            del self._entries[key]
+            return "miss", None
+        self._entries.move_to_end(key)
+        return ("fresh" if age <= self.ttl else "stale"), value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def discard(self, key) -> bool:
+        """Drop one entry; returns whether it was there."""
+        return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """Drop every entry; bumps ``generation`` so dependants can tell."""
+        self._entries.clear()
+        self.generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get_or_load(self, key, load, revalidate=None):
+        """Read-through lookup.
+
+        ``load`` is awaited on a miss. On a stale hit the cached value is
+        returned immediately and ``revalidate`` (defaults to ``load``) refreshes
+        the entry in the background, so it may use a cheaper, less consistent
+        read path.
+        """
+        status, value = self.get(key)
+        if status == "fresh":
+            self.stats["hits"] += 1
+            return value
+        if status == "stale":
+            self.stats["stale_hits"] += 1
+            if key not in self._refreshing:
+                self._refreshing[key] = asyncio.create_task(self._refresh(key, revalidate or load))
+            return value
+        self.stats["misses"] += 1
+        generation = self.generation
+        value = await load()
+        if generation == self.generation:
+            self.set(key, value)
+        return value
+
+    async def _refresh(self, key, load):
+        generation = self.generation
+        try:
+            value = await load()
+            if generation == self.generation:
+                self.set(key, value)
+        except Exception:
+            # Keep serving the stale value; the next miss will surface the error
+            pass
+        finally:
+            self._refreshing.pop(key, None)
+
+
+# Canister event reads, invalidated whenever this process writes events
+event_cache = TTLCache(EVENT_CACHE_SIZE, EVENT_CACHE_TTL, EVENT_CACHE_STALE_TTL)
@@ -0,0 +1,111 @@
+# canister.py
+import os
+import time
+import aiohttp
+from transport import HttpPool
+
+QUERY = "query"
+UPDATE = "update"
+
+# How each tool reaches the canister. Queries are answered by a single replica
+# without consensus; updates go through consensus and are needed for writes and
+# for anything that makes inter-canister or outgoing HTTP calls (the threshold
+# ECDSA wallet behind /canister-address). Unknown tools default to UPDATE.
+TOOL_MODES = {
+    "get_events": QUERY,
+    "get_event_by_id": QUERY,
+    "get_events_by_ids": QUERY,
+    "get_event_changes": QUERY,
+    "count_events": QUERY,
+    "payment": QUERY,
+    "canister_address": UPDATE,
+    "create_event": UPDATE,
+    "create_events_bulk": UPDATE,
+}
+
+# How often agents log the per-mode latency counters, in seconds
+CANISTER_STATS_INTERVAL = float(os.getenv("CANISTER_STATS_INTERVAL", "300"))
+
+FORCE_UPDATE_HEADERS = {"X-Ic-Force-Update": "true"}
+
+# Query responses the gateway could not certify, or that a lagging replica
+# does not know about yet, are retried as an update call
+FALLBACK_STATUSES = {404, 500, 502, 503, 504}
+
+
+class LatencyCounter:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, ok: bool = True):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if not ok:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(1000 * self.total / self.count, 2) if self.count else 0.0,
+            "max_ms": round(1000 * self.max, 2),
+        }
+
+
+class CanisterClient:
+    """Canister gateway client that picks the query or update path per tool."""
+
+    def __init__(self, pool: HttpPool):
+        self.pool = pool
+        self.latency = {QUERY: LatencyCounter(), UPDATE: LatencyCounter()}
+        self.fallbacks = 0
+
+    async def call(self, func_name: str, method: str, path: str, *, params: dict = None, json=None, is_stale=None):
+        """Call ``path`` in the mode registered for ``func_name``.
+
+        ``is_stale(result)`` lets the caller reject a query answer (e.g. an
+        event a lagging replica has not seen yet) and retry it as an update.
+        """
+        if TOOL_MODES.get(func_name, UPDATE) == UPDATE:
+            return await self.update(method, path, params=params, json=json)
+        try:
+            result = await self.query(method, path, params=params, json=json)
+        except aiohttp.ClientResponseError as e:
+            if e.status not in FALLBACK_STATUSES:
+                raise
+        else:
+            if is_stale is None or not is_stale(result):
+                return result
+        return await self.fallback(method, path, params=params, json=json)
+
+    async def fallback(self, method: str, path: str, **kwargs):
+        """Ask again as an update, for a query answer a lagging replica could not give."""
+        self.fallbacks += 1
+        return await self.update(method, path, **kwargs)
+
+    async def query(self, method: str, path: str, **kwargs):
+        return await self._timed(QUERY, method, path, **kwargs)
+
+    async def update(self, method: str, path: str, **kwargs):
+        return await self._timed(UPDATE, method, path, headers=FORCE_UPDATE_HEADERS, **kwargs)
+
+    async def _timed(self, mode: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = await self.pool.request(method, path, **kwargs)
+            ok = True
+            return result
+        finally:
+            self.latency[mode].observe(time.perf_counter() - started, ok)
+
+    def stats(self) -> dict:
+        return {
+            QUERY: self.latency[QUERY].snapshot(),
+            UPDATE: self.latency[UPDATE].snapshot(),
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,22 @@
+# config.py
+import os
+from dotenv import load_dotenv
+
+# Import this before the other local modules so their tunables see .env too
+load_dotenv()
+
+# ================= ASI1 CONFIG =================
+ASI1_API_KEY = os.getenv("ASI1_API_KEY")
+ASI1_BASE_URL = os.getenv("ASI1_BASE_URL", "https://api.asi1.ai/v1")
+ASI1_HEADERS = {
+    "Authorization": f"Bearer {ASI1_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+# ================= ICP BASE CONFIG =================
+CANISTER_ID = "w7lou-c7777-77774-qaamq-cai"
+CANISTER_BASE_URL = os.getenv("CANISTER_BASE_URL", "http://127.0.0.1:4943")
+CANISTER_HEADERS = {
+    "Host": f"{CANISTER_ID}.localhost",
+    "Content-Type": "application/json"
+}
@@ -0,0 +1,141 @@
+# encoding.py
+import os
+import re
+
+# Tokens a single tool result may take in the ASI1 prompt before rows are cut
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "600"))
+
+# The columns encoded for event rows, in order, with their short names. Other fields, such as the
+# nested organizer ``user`` (a UUID username), cost more tokens than they are worth and are left out
+SHORT_KEYS = {
+    "id": "id",
+    "name": "name",
+    "date": "date",
+    "location": "loc",
+    "price": "eth",
+    "capacity": "cap",
+    "booked_count": "booked",
+    "min_age": "age",
+    "user_id": "org",
+}
+
+NUMERIC_KEYS = {"id", "price", "capacity", "booked_count", "min_age", "user_id"}
+
+ISO_DATETIME = re.compile(r"^(\d{4}-\d{2}-\d{2})T00:00(?::00(?:\.0+)?)?(?:Z|[+-]00:?00)?$")
+SEPARATORS = re.compile(r"[|\n\r]+")
+
+
+def approx_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def normalize(value, numeric: bool = False) -> str:
+    """Shortest faithful text for one cell: 0.050 -> 0.05, 100.0 -> 100, midnight timestamps -> dates.
+
+    Numeric strings are only rewritten when ``numeric`` is set, so a name like "007" survives.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "y" if value else "n"
+    if isinstance(value, (int, float)):
+        return f"{value:.6g}" if isinstance(value, float) else str(value)
+    text = SEPARATORS.sub(" ", str(value)).strip()
+    if numeric and _is_number(text):
+        number = float(text)
+        return f"{number:.6g}" if abs(number) < 1e15 else text
+    match = ISO_DATETIME.match(text)
+    return match.group(1) if match else text
+
+
+class ToolResultEncoder:
+    """Turns lists of records into a compact table for the ASI1 prompt.
+
+        events[3] id|name|date|eth
+        same for all: loc=Bali; cap=100
+        4|Sunset Jazz|2025-08-14|0.04
+        ...
+
+    Columns that hold one value across every row move to the ``same for all``
+    line. Only the ``SHORT_KEYS`` columns are encoded. Rows past ``budget``
+    tokens are replaced by a count and the ranges of the dropped rows.
+    ``stats`` compares the output to ``baseline``, the text that would have
+    been sent otherwise, and ``baseline`` is returned instead when the table
+    would not be shorter.
+    """
+
+    def __init__(self, budget: int = TOOL_RESULT_TOKEN_BUDGET):
+        self.budget = budget
+        self.stats = {"calls": 0, "baseline_tokens": 0, "compact_tokens": 0, "rows_cut": 0}
+        self.last_saving = 0
+
+    def encode(self, rows: list, label: str = "events", baseline: str = None) -> str:
+        rows = [row for row in rows if isinstance(row, dict)]
+        if not rows:
+            return f"{label}[0]"
+        keys = [k for k in SHORT_KEYS if any(k in row for row in rows)]
+        cells = [[normalize(row.get(k), k in NUMERIC_KEYS) for k in keys] for row in rows]
+
+        shared = []
+        if len(rows) > 1:
+            for i, key in enumerate(keys):
+                if key != "id" and all(cell[i] == cells[0][i] for cell in cells):
+                    shared.append(i)
+        columns = [i for i in range(len(keys)) if i not in shared]
+
+        lines = [f"{label}[{len(rows)}] " + "|".join(SHORT_KEYS[keys[i]] for i in columns)]
+        if shared:
+            lines.append("same for all: " + "; ".join(f"{SHORT_KEYS[keys[i]]}={cells[0][i]}" for i in shared))
+        used = approx_tokens("\n".join(lines))
+        shown = 0
+        for cell in cells:
+            line = "|".join(cell[i] for i in columns)
+            cost = approx_tokens(line) + 1
+            if used + cost > self.budget and shown:
+                break
+            lines.append(line)
+            used += cost
+            shown += 1
+        if shown < len(rows):
+            lines.append(self._summary(label, rows[shown:], keys, cells[shown:]))
+
+        text = "\n".join(lines)
+        if baseline is not None and shown == len(rows) and approx_tokens(baseline) <= approx_tokens(text):
+            text = baseline
+        self._record(text, baseline, len(rows) - shown)
+        return text
+
+    def _summary(self, label: str, rows: list, keys: list, cells: list) -> str:
+        parts = [f"... {len(rows)} more {label} not shown"]
+        for key in ("date", "price"):
+            if key not in keys:
+                continue
+            i = keys.index(key)
+            values = [cell[i] for cell in cells if cell[i]]
+            if key == "price":
+                values = [float(v) for v in values if _is_number(v)]
+            if values:
+                parts.append(f"{SHORT_KEYS[key]} {normalize(min(values))}..{normalize(max(values))}")
+        return "; ".join(parts)
+
+    def _record(self, text: str, baseline: str, cut: int):
+        compact = approx_tokens(text)
+        before = approx_tokens(baseline) if baseline is not None else compact
+        self.stats["calls"] += 1
+        self.stats["baseline_tokens"] += before
+        self.stats["compact_tokens"] += compact
+        self.stats["rows_cut"] += cut
+        self.last_saving = before - compact
+
+    def savings(self) -> float:
+        """Fraction of baseline tokens saved so far."""
+        baseline = self.stats["baseline_tokens"]
+        return 1 - self.stats["compact_tokens"] / baseline if baseline else 0.0
+
+
+def _is_number(value: str) -> bool:
+    try:
+        number = float(value)
+    except ValueError:
+        return False
+    return number == number
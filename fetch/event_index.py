@@ -0,0 +1,245 @@
+# event_index.py
+import os
+import re
+import time
+import heapq
+import asyncio
+from array import array
+from datetime import date
+from canister import CanisterClient
+from event_pages import EventPages, EVENT_PAGE_SIZE, count_events
+
+# Seconds between checks for changed events, and the maximum age before a full rebuild anyway
+EVENT_INDEX_REFRESH = float(os.getenv("EVENT_INDEX_REFRESH", "60"))
+EVENT_INDEX_FULL_REFRESH = float(os.getenv("EVENT_INDEX_FULL_REFRESH", "600"))
+EVENT_INDEX_TOP_K = int(os.getenv("EVENT_INDEX_TOP_K", "10"))
+
+TOKEN = re.compile(r"[a-z0-9]+")
+MISSING_DATE = -1
+MISSING_PRICE = float("nan")
+
+
+def tokens(text) -> set:
+    return set(TOKEN.findall(str(text or "").lower()))
+
+
+def date_ordinal(value) -> int:
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return MISSING_DATE
+
+
+def price_value(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return MISSING_PRICE
+
+
+class EventIndex:
+    """Columnar in-memory copy of the events table with token indexes.
+
+    Each event is a row position shared by the column arrays. ``name_index`` and
+    ``location_index`` map lowercase tokens to row positions, so text and
+    location filters are set intersections instead of scans.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.dates = array("l")
+        self.prices = array("d")
+        self.capacities = array("l")
+        self.booked = array("l")
+        self.names = []
+        self.locations = []
+        self.raw_dates = []
+        self.raw_prices = []
+        self.rows = {}
+        self.name_index = {}
+        self.location_index = {}
+        self.built_at = 0.0
+        # Canister revision of the newest change applied, see EventIndexRefresher
+        self.revision = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def upsert(self, event: dict):
+        """Add or replace one event, e.g. right after this agent created or fetched it."""
+        if not event or event.get("id") is None:
+            return
+        event_id = int(event["id"])
+        row = self.rows.get(event_id)
+        if row is None:
+            row = len(self.ids)
+            self.rows[event_id] = row
+            self.ids.append(event_id)
+            self.dates.append(MISSING_DATE)
+            self.prices.append(MISSING_PRICE)
+            self.capacities.append(0)
+            self.booked.append(0)
+            self.names.append("")
+            self.locations.append("")
+            self.raw_dates.append("")
+            self.raw_prices.append("")
+        else:
+            self._unindex(row)
+        self.dates[row] = date_ordinal(event.get("date"))
+        self.prices[row] = price_value(event.get("price"))
+        self.capacities[row] = int(event.get("capacity") or 0)
+        self.booked[row] = int(event.get("booked_count") or 0)
+        self.names[row] = str(event.get("name") or "")
+        # Locations repeat a lot across events; share the string objects
+        self.locations[row] = _intern(str(event.get("location") or ""))
+        self.raw_dates[row] = str(event.get("date") or "")
+        self.raw_prices[row] = str(event.get("price") or "")
+        for token in tokens(self.names[row]):
+            self.name_index.setdefault(token, set()).add(row)
+        for token in tokens(self.locations[row]):
+            self.location_index.setdefault(token, set()).add(row)
+
+    def search(self, text: str = None, location: str = None, min_price: float = None, max_price: float = None,
+               date_from: str = None, date_to: str = None, available_only: bool = False,
+               sort_by: str = "date", descending: bool = False, top_k: int = EVENT_INDEX_TOP_K) -> list:
+        """Return up to ``top_k`` matching events as dicts, sorted by ``date``, ``price`` or ``name``."""
+        candidates = None
+        for token in tokens(text):
+            rows = self.name_index.get(token, set()) | self.location_index.get(token, set())
+            candidates = rows if candidates is None else candidates & rows
+        for token in tokens(location):
+            rows = self.location_index.get(token, set())
+            candidates = rows if candidates is None else candidates & rows
+        if candidates is None:
+            candidates = range(len(self.ids))
+
+        low_date = date_ordinal(date_from) if date_from else None
+        high_date = date_ordinal(date_to) if date_to else None
+        matches = []
+        for row in candidates:
+            price = self.prices[row]
+            if min_price is not None and not price >= float(min_price):
+                continue
+            if max_price is not None and not price <= float(max_price):
+                continue
+            day = self.dates[row]
+            if low_date is not None and (day == MISSING_DATE or day < low_date):
+                continue
+            if high_date is not None and (day == MISSING_DATE or day > high_date):
+                continue
+            if available_only and self.booked[row] >= self.capacities[row]:
+                continue
+            matches.append(row)
+
+        key = self._sort_key(sort_by)
+        top_k = max(1, int(top_k or EVENT_INDEX_TOP_K))
+        rows = heapq.nlargest(top_k, matches, key) if descending else heapq.nsmallest(top_k, matches, key)
+        return [self._event(row) for row in rows]
+
+    def _sort_key(self, sort_by: str):
+        if sort_by == "price":
+            # NaN prices sort last
+            return lambda row: (self.prices[row] != self.prices[row], self.prices[row])
+        if sort_by == "name":
+            return lambda row: self.names[row].lower()
+        return lambda row: self.dates[row]
+
+    def _event(self, row: int) -> dict:
+        return {
+            "id": self.ids[row],
+            "name": self.names[row],
+            "date": self.raw_dates[row],
+            "location": self.locations[row],
+            "price": self.raw_prices[row],
+            "capacity": self.capacities[row],
+            "booked_count": self.booked[row],
+        }
+
+    def _unindex(self, row: int):
+        for token in tokens(self.names[row]):
+            self.name_index.get(token, set()).discard(row)
+        for token in tokens(self.locations[row]):
+            self.location_index.get(token, set()).discard(row)
+
+
+_interned = {}
+
+
+def _intern(value: str) -> str:
+    return _interned.setdefault(value, value)
+
+
+class EventIndexRefresher:
+    """Keeps an EventIndex in sync with the canister.
+
+    Every event carries a revision that the canister bumps on each create or
+    edit. ``refresh`` asks ``/events/changes`` for the events past the
+    index's revision and upserts them in place. A full rebuild happens only
+    when rows were deleted (the count no longer matches) or the index is
+    older than ``full_refresh``. It is built off to the side and swapped in,
+    so searches never see a half-built index. Refreshes run one at a time;
+    concurrent callers wait for the one in flight instead of starting their own.
+
+    Deletions leave no revision behind, so they are only noticed through the
+    count. A delete and a create within one interval cancel out, and the
+    deleted event stays searchable until the next full rebuild.
+    """
+
+    def __init__(self, canister: CanisterClient, full_refresh: float = EVENT_INDEX_FULL_REFRESH,
+                 page_size: int = EVENT_PAGE_SIZE):
+        self.canister = canister
+        self.full_refresh = full_refresh
+        self.page_size = page_size
+        self.index = EventIndex()
+        self.rebuilds = 0
+        self.updates = 0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Bring the index up to date; returns whether anything in it changed."""
+        async with self._lock:
+            return await self._refresh(force)
+
+    async def search(self, **filters) -> list:
+        if not self.index.built_at:
+            async with self._lock:
+                # Whoever held the lock may have just built it
+                if not self.index.built_at:
+                    await self._refresh(force=True)
+        return self.index.search(**filters)
+
+    async def _refresh(self, force: bool) -> bool:
+        if not force and self.index.built_at and time.monotonic() - self.index.built_at < self.full_refresh:
+            changed = await self._catch_up(self.index)
+            if len(self.index) == await count_events(self.canister):
+                self.updates += changed
+                return changed > 0
+        index = EventIndex()
+        # Whatever changes during the walk is past this revision and picked up right after it
+        revision = (await self._changes(0, 0))["revision"]
+        async for page in EventPages(self.canister, page_size=self.page_size):
+            for event in page:
+                index.upsert(event)
+        index.revision = revision
+        await self._catch_up(index)
+        index.built_at = time.monotonic()
+        self.index = index
+        self.rebuilds += 1
+        return True
+
+    async def _catch_up(self, index: EventIndex) -> int:
+        """Upsert the events changed since ``index.revision``; returns how many there were."""
+        changed = 0
+        while True:
+            page = await self._changes(index.revision, self.page_size)
+            for event in page["events"]:
+                index.upsert(event)
+            changed += len(page["events"])
+            index.revision = max(index.revision, int(page["revision"]))
+            if len(page["events"]) < self.page_size:
+                return changed
+
+    async def _changes(self, since: int, limit: int) -> dict:
+        return await self.canister.call(
+            "get_event_changes", "GET", "/events/changes", params={"since": since, "limit": limit}
+        )
@@ -0,0 +1,94 @@
+# event_pages.py
+import os
+import asyncio
+from canister import CanisterClient
+
+EVENT_PAGE_SIZE = int(os.getenv("EVENT_PAGE_SIZE", "100"))
+# Pages fetched ahead of the consumer; the producer blocks once this many are buffered
+EVENT_PAGE_PREFETCH = int(os.getenv("EVENT_PAGE_PREFETCH", "2"))
+
+_DONE = object()
+
+
+async def count_events(canister: CanisterClient) -> int:
+    return int(await canister.call("count_events", "GET", "/events/count"))
+
+
+class EventPages:
+    """Async iterator over the canister's events table, one page at a time.
+
+    ``GET /events/count`` sizes the walk, then a background task fetches pages
+    of ``page_size`` into a queue bounded by ``prefetch``. The next page is
+    already in flight while the caller processes the current one, and a slow
+    caller stalls the fetcher instead of growing memory. Pages follow the
+    canister's date ordering, so rows inserted mid-walk may shift across pages.
+
+        async for page in EventPages(canister):
+            ...
+    """
+
+    def __init__(self, canister: CanisterClient, page_size: int = EVENT_PAGE_SIZE,
+                 prefetch: int = EVENT_PAGE_PREFETCH, offset: int = 0):
+        self.canister = canister
+        self.page_size = page_size
+        self.offset = offset
+        self.total = None
+        self.pages_fetched = 0
+        self._queue = asyncio.Queue(maxsize=max(1, prefetch))
+        self._task = None
+        self._finished = False
+
+    @property
+    def buffered(self) -> int:
+        """Pages fetched but not yet consumed."""
+        return self._queue.qsize()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> list:
+        if self._finished:
+            raise StopAsyncIteration
+        if self._task is None:
+            self._task = asyncio.create_task(self._produce())
+        item = await self._queue.get()
+        if item is _DONE or isinstance(item, Exception):
+            self._finished = True
+            if item is _DONE:
+                raise StopAsyncIteration
+            raise item
+        return item
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _produce(self):
+        try:
+            self.total = await count_events(self.canister)
+            for offset in range(self.offset, self.total, self.page_size):
+                page = await self.canister.call(
+                    "get_events", "GET", "/events", params={"limit": self.page_size, "offset": offset}
+                )
+                if isinstance(page, dict):
+                    page = page.get("events", [])
+                self.pages_fetched += 1
+                if page:
+                    await self._queue.put(page)
+                if len(page) < self.page_size:
+                    break
+        except Exception as e:
+            await self._queue.put(e)
+            return
+        await self._queue.put(_DONE)
+
+
+async def iter_events(canister: CanisterClient, page_size: int = EVENT_PAGE_SIZE, prefetch: int = EVENT_PAGE_PREFETCH):
+    """Yield every event in the catalog with at most ``prefetch + 1`` pages in memory."""
+    pages = EventPages(canister, page_size, prefetch)
+    try:
+        async for page in pages:
+            for event in page:
+                yield event
+    finally:
+        await pages.aclose()
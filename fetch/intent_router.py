@@ -0,0 +1,184 @@
+# intent_router.py
+import os
+import re
+import json
+
+# Minimum confidence for a query to skip the ASI1 tool-selection call
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.8"))
+# Lower bar used while ASI1 is unreachable, when a best guess beats no answer
+INTENT_ROUTER_DEGRADED_THRESHOLD = float(os.getenv("INTENT_ROUTER_DEGRADED_THRESHOLD", "0.3"))
+
+# An event ID must be anchored: "event 5", "events 3, 7 and 12", "event id 5", "id 5", "#5" or "ev12345".
+# Groups: 1 plain "event(s)" anchor, 2 its number, 3 a number after "id"/"#", 4 an "ev" ID
+EVENT_ID = re.compile(
+    r"\b(events?\s+(?:(?:id|no\.?|number)\s*)?#?)(\d+)\b|(?:\bid\s*#?|(?<!\w)#)(\d+)\b|\b(ev\d+)\b",
+    re.IGNORECASE,
+)
+# More IDs listed after an anchored one: ", 7", "and 12", "or #13"
+ID_LIST = re.compile(r"\s*(?:,\s*(?:and\s+|or\s+)?|\s(?:and|or|&)\s+)#?(\d+)\b", re.IGNORECASE)
+NUMBER = re.compile(r"\d+")
+# After a plain "event" anchor, years and amounts are filters rather than IDs
+YEAR = re.compile(r"(?:19|20)\d\d")
+QUANTITY = re.compile(
+    r"\s*(?:seats?|spots?|places?|people|persons?|guests?|tickets?|attendees|participants|capacity|eth|usd|days?|"
+    r"weeks?|months?|years?)\b",
+    re.IGNORECASE,
+)
+LIMIT = re.compile(r"\b(?:limit(?:\s+of)?|first|top)\s*(\d+)\b", re.IGNORECASE)
+OFFSET = re.compile(r"\b(?:offset|skip(?:ping)?)\s*(\d+)\b", re.IGNORECASE)
+
+INTENTS = {
+    "payment": (re.compile(r"\b(?:pay|payment|checkout|buy|purchase)\b", re.IGNORECASE), 0.95),
+    "canister_address": (re.compile(r"\bcanister(?:'s)?\s+address\b|\baddress of (?:this|the)\b.*\bcanister\b", re.IGNORECASE), 0.95),
+    "get_event_by_id": (re.compile(r"\b(?:events?|details?|info(?:rmation)?)\b", re.IGNORECASE), 0.9),
+    "get_events": (re.compile(r"\b(?:list|all|upcoming|show|get)\b.*\bevents\b|\bevents\s+list\b", re.IGNORECASE), 0.9),
+}
+
+CONJUNCTION = re.compile(r"\b(?:and|also|then|plus)\b", re.IGNORECASE)
+
+# Anything that needs reasoning, filtering or a write goes to ASI1, as does any
+# location, date, price, availability or ordering condition
+DEFER = re.compile(
+    r"\b(?:create|new|add|schedule|organi[sz]e|update|delete|cancel|compare|recommend|best|why|how much|"
+    r"in|at|near|around|located|location|city|"
+    r"today|tonight|tomorrow|yesterday|week(?:end)?s?|months?|years?|next|last|past|this|coming|soon|happening|"
+    r"before|after|since|until|between|during|on|from|"
+    r"free|cheap\w*|expensive|price[sd]?|pricing|cost\w*|under|below|above|over|less|more|eth|"
+    r"available|availability|seats?|spots?|full|sold|open|remaining|left|capacity|"
+    r"sort(?:ed)?|order(?:ed)?|by|newest|oldest|latest|earliest|popular|top\s+rated|"
+    r"with|without|not|only|except|where|which|that)\b",
+    re.IGNORECASE,
+)
+# The only words a plain get_events request may contain besides its limit and offset
+LIST_FILLER = frozenset(
+    "list show get display give fetch see view all the events event me us please can could would you i want to "
+    "like a an of every upcoming".split()
+)
+WORD = re.compile(r"[a-z']+", re.IGNORECASE)
+
+
+class IntentRouter:
+    """Deterministic pre-router that maps plain commands straight to tool calls.
+
+    ``route`` returns ``(tool_calls, confidence)``; ``tool_calls`` is None
+    when the query should go to ASI1 instead.
+    """
+
+    def __init__(self, tool_names: set, threshold: float = INTENT_ROUTER_THRESHOLD):
+        self.tool_names = set(tool_names)
+        self.threshold = threshold
+        self.stats = {"routed": 0, "deferred": 0, "by_tool": {}}
+
+    def route(self, query: str, threshold: float = None):
+        func_name, arguments_list, confidence = self._classify(query)
+        threshold = self.threshold if threshold is None else threshold
+        if func_name is None or confidence < threshold:
+            self.stats["deferred"] += 1
+            return None, confidence
+        self.stats["routed"] += 1
+        self.stats["by_tool"][func_name] = self.stats["by_tool"].get(func_name, 0) + 1
+        tool_calls = [
+            {
+                "id": f"router_{index}",
+                "type": "function",
+                "function": {"name": func_name, "arguments": json.dumps(arguments)},
+            }
+            for index, arguments in enumerate(arguments_list)
+        ]
+        return tool_calls, confidence
+
+    def hit_rate(self) -> float:
+        total = self.stats["routed"] + self.stats["deferred"]
+        return self.stats["routed"] / total if total else 0.0
+
+    def _classify(self, query: str):
+        text = query.strip()
+        if not text or DEFER.search(text):
+            return None, [], 0.0
+
+        matched = [(name, base) for name, (pattern, base) in INTENTS.items() if pattern.search(text)]
+        event_ids, spans = self._event_ids(text)
+        limit = LIMIT.search(text)
+        offset = OFFSET.search(text)
+        spans += [m.span(1) for m in (limit, offset) if m]
+        if any(not any(start <= m.start() < end for start, end in spans) for m in NUMBER.finditer(text)):
+            # A number that is neither an anchored ID nor a page size, e.g. a year or a seat count
+            return None, [], 0.0
+
+        # Most commands mention "event(s)" only to name their target, so the
+        # event intents are dropped unless they are the only reading left
+        names = {name for name, _ in matched}
+        drop = set()
+        if "get_events" in names and "get_event_by_id" in names:
+            drop.add("get_events" if event_ids else "get_event_by_id")
+        if "canister_address" in names and not event_ids:
+            drop.update({"get_events", "get_event_by_id"})
+        if "payment" in names and not CONJUNCTION.search(text):
+            drop.update({"get_events", "get_event_by_id"})
+        matched = [m for m in matched if m[0] not in drop]
+
+        if not matched:
+            return None, [], 0.0
+        func_name, confidence = matched[0]
+        if func_name not in self.tool_names:
+            # Another agent serves this intent
+            return None, [], 0.0
+        if len(matched) > 1:
+            # Mixed intent ("show event 5 and pay for it"), let ASI1 plan it
+            confidence -= 0.3 * (len(matched) - 1)
+        if len(text.split()) > 20:
+            confidence -= 0.2
+
+        if func_name in ("payment", "get_event_by_id"):
+            if not event_ids:
+                return func_name, [], 0.0
+            if len(event_ids) > 1:
+                confidence -= 0.05
+            return func_name, [{"eventId": event_id} for event_id in event_ids], confidence
+
+        if func_name == "get_events":
+            # Anything beyond filler is a condition the unfiltered first page would ignore
+            rest = text
+            for m in sorted((m for m in (limit, offset) if m), key=lambda m: m.start(), reverse=True):
+                rest = rest[:m.start()] + " " + rest[m.end():]
+            if any(word.lower() not in LIST_FILLER for word in WORD.findall(rest)):
+                return None, [], 0.0
+            if event_ids:
+                confidence -= 0.3
+            arguments = {}
+            if limit:
+                arguments["limit"] = int(limit.group(1))
+            if offset:
+                arguments["offset"] = int(offset.group(1))
+            return func_name, [arguments], confidence
+
+        return func_name, [{}], confidence
+
+    @staticmethod
+    def _event_ids(text: str):
+        """Anchored event IDs in ``text`` and the spans they cover."""
+        ids, spans = [], []
+
+        def add(event_id: str, span: tuple, plain: bool):
+            if plain and (YEAR.fullmatch(event_id) or QUANTITY.match(text, span[1])):
+                return
+            spans.append(span)
+            if event_id not in ids:
+                ids.append(event_id)
+
+        for match in EVENT_ID.finditer(text):
+            if match.group(4):
+                add(match.group(4), match.span(4), False)
+                continue
+            group = 2 if match.group(2) else 3
+            # "event 2025" may be a year, "event #2025" or "id 2025" is an ID
+            plain = group == 2 and "#" not in match.group(1) and not re.search(r"id|no|number", match.group(1), re.I)
+            add(match.group(group), match.span(group), plain)
+            end = match.end()
+            while True:
+                more = ID_LIST.match(text, end)
+                if more is None:
+                    break
+                add(more.group(1), more.span(1), plain)
+                end = more.end()
+        return ids, spans
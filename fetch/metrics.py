@@ -0,0 +1,136 @@
+# metrics.py
+import os
+import time
+from collections import deque
+from uagents import Model
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Most recent samples kept per stage for the percentiles
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class MetricsReport(Model):
+    enabled: bool
+    stages: dict
+    errors: dict
+    tokens: dict
+    counters: dict
+
+
+class Histogram:
+    """Latency samples in seconds; percentiles come from the last ``window`` samples."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": 0}
+
+        def pct(q: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 2),
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+        if exc_type is not None:
+            self.metrics.error(self.stage)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Metrics:
+    """Per-stage timings, ASI1 token usage and error counts for one agent process.
+
+        with metrics.span("final"):
+            response_json = await asi1.post(...)
+
+    Disabled, ``span`` hands back a shared no-op and the other methods return
+    immediately, so instrumented code pays one attribute check.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.stages = {}
+        self.errors = {}
+        self.tokens = dict.fromkeys(TOKEN_FIELDS, 0)
+
+    def span(self, stage: str):
+        return _Span(self, stage) if self.enabled else _NOOP
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def error(self, stage: str):
+        if self.enabled:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def record_usage(self, usage: dict):
+        """Add the ``usage`` block of an ASI1 completion to the token counters."""
+        if not self.enabled or not usage:
+            return
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        self.tokens["prompt_tokens"] += prompt
+        self.tokens["completion_tokens"] += completion
+        self.tokens["total_tokens"] += int(usage.get("total_tokens") or prompt + completion)
+
+    def report(self, counters: dict = None) -> MetricsReport:
+        return MetricsReport(
+            enabled=self.enabled,
+            stages={stage: histogram.snapshot() for stage, histogram in sorted(self.stages.items())},
+            errors=dict(self.errors),
+            tokens=dict(self.tokens),
+            counters=counters or {},
+        )
+
+
+# Process-wide; each agent runs in its own process
+metrics = Metrics()
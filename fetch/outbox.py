@@ -0,0 +1,265 @@
+# outbox.py
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import aiohttp
+from cache import event_cache
+from canister import CanisterClient
+from tool_registry import TOOLS, keyed
+
+# SQLite file pending creates are written to before they are sent; by default one per agent,
+# outbox_<agent name>.db in the working directory. ":memory:" keeps them in memory only
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "")
+OUTBOX_FLUSH_INTERVAL = float(os.getenv("OUTBOX_FLUSH_INTERVAL", "5"))
+# Pending creates sent together in one POST /events/bulk
+OUTBOX_BATCH_MAX = int(os.getenv("OUTBOX_BATCH_MAX", "100"))
+# How long a create_event call waits for its write before answering "being created"
+OUTBOX_WAIT = float(os.getenv("OUTBOX_WAIT", "2"))
+OUTBOX_RETRY_BACKOFF = float(os.getenv("OUTBOX_RETRY_BACKOFF", "1"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "300"))
+# Sent and failed entries are kept this long, so a create resent with the same key is answered locally
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", "86400"))
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        key TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        next_attempt REAL NOT NULL,
+        result TEXT,
+        error TEXT
+    )
+"""
+
+# A failed entry is replaced when its key is sent again, so a corrected event can be retried
+INSERT = """
+    INSERT INTO outbox (key, payload, status, created_at, next_attempt) VALUES (?, ?, 'pending', ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        payload = excluded.payload, status = 'pending', attempts = 0, created_at = excluded.created_at,
+        next_attempt = excluded.next_attempt, error = NULL
+    WHERE status = 'failed'
+"""
+
+
+def outbox_path(agent_name: str) -> str:
+    return OUTBOX_PATH or f"outbox_{re.sub(r'[^A-Za-z0-9_-]+', '_', agent_name)}.db"
+
+
+def permanent(error: Exception) -> bool:
+    """Whether retrying the write cannot help: the canister rejected the request itself."""
+    return isinstance(error, aiohttp.ClientResponseError) and 400 <= error.status < 500 and error.status != 429
+
+
+class Outbox:
+    """Durable queue of ``create_event`` writes, flushed to the canister in the background.
+
+    Serves as the ``create_event`` handler of a ``ToolSet``:
+
+        outbox = Outbox(canister, outbox_path(AGENT_NAME))
+        toolset = ToolSet(["create_event"], canister, handlers={"create_event": outbox.handler})
+
+    Every create gets a new idempotency key and is stored under it before
+    anything is sent, so it survives a crash. Pending entries are sent one
+    per ``POST /events`` or, when several are due, in one
+    ``POST /events/bulk``. The canister dedupes by key, so a write whose
+    reply was lost is simply sent again. Transient failures are retried with
+    exponential backoff; entries the canister rejects are marked failed
+    until their key is sent again. ``handler`` waits up to ``wait`` seconds
+    for the write and otherwise answers that the event is being created.
+
+    The database is opened on first use, and every SQLite call runs in a
+    worker thread, one at a time, so commits never block the event loop.
+    """
+
+    def __init__(self, canister: CanisterClient, path: str, batch_max: int = OUTBOX_BATCH_MAX,
+                 wait: float = OUTBOX_WAIT, backoff: float = OUTBOX_RETRY_BACKOFF,
+                 backoff_max: float = OUTBOX_RETRY_MAX, retention: float = OUTBOX_RETENTION, cache=event_cache):
+        self.canister = canister
+        self.path = path
+        self.batch_max = max(1, batch_max)
+        self.wait = wait
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.retention = retention
+        self.cache = cache
+        self.stats = {"enqueued": 0, "resubmitted": 0, "sent": 0, "batches": 0, "retries": 0, "failed": 0}
+        self.pending = 0
+        self._db = None
+        self._db_lock = asyncio.Lock()
+        self._waiters = {}
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def handler(self, arguments: dict) -> dict:
+        return await self.create(arguments)
+
+    async def create(self, event: dict) -> dict:
+        """Queue ``event`` and return the created event, or ``{"queued": True, ...}`` if it is not written yet.
+
+        Raises ``ValueError`` when the canister rejects the event.
+        """
+        key = await self.enqueue(event)
+        entry = await self.entry(key)
+        if entry["status"] == PENDING and self.wait > 0:
+            waiter = self._waiters.get(key)
+            if waiter is None:
+                waiter = self._waiters[key] = asyncio.get_running_loop().create_future()
+            self.kick()
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self.wait)
+            except asyncio.TimeoutError:
+                pass
+            entry = await self.entry(key)
+        if entry["status"] == SENT:
+            return entry["result"]
+        if entry["status"] == FAILED:
+            raise ValueError(f"{entry['error']} (reference {key})")
+        self.kick()
+        return dict(entry["payload"], queued=True)
+
+    async def enqueue(self, event: dict) -> str:
+        """Store ``event`` under its key, replacing a failed entry with the same key; returns the key."""
+        payload = keyed(event)
+        resubmitted = "idempotency_key" in event
+        if await self._run(self._insert, payload):
+            self.stats["resubmitted" if resubmitted else "enqueued"] += 1
+        return payload["idempotency_key"]
+
+    async def entry(self, key: str) -> dict:
+        return await self._run(self._entry, key)
+
+    def kick(self):
+        """Start flushing in the background unless a flush is already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+
+    async def flush(self) -> int:
+        """Send the pending entries that are due, one batch; returns how many were written."""
+        async with self._lock:
+            rows = await self._run(self._due)
+            if not rows:
+                return 0
+            payloads = [json.loads(payload) for _, payload, _ in rows]
+            try:
+                outcomes = await self._send(payloads)
+            except Exception as e:
+                if not permanent(e):
+                    await self._run(self._reschedule, rows)
+                    self.stats["retries"] += len(rows)
+                    return 0
+                outcomes = [(None, str(e))] * len(rows)
+            settled = [(key, event, error) for (key, _, _), (event, error) in zip(rows, outcomes)]
+            await self._run(self._settle, settled)
+            written = sum(event is not None for _, event, _ in settled)
+            for key, _, _ in settled:
+                self._resolve(key)
+            self.stats["sent"] += written
+            self.stats["failed"] += len(settled) - written
+            self.stats["batches"] += 1
+            if written:
+                self.cache.clear()
+            return written
+
+    async def prune(self) -> int:
+        """Drop sent and failed entries older than ``retention``; returns how many were dropped."""
+        return await self._run(self._prune, time.time() - self.retention)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, pending=self.pending)
+
+    async def close(self):
+        async with self._db_lock:
+            if self._db is not None:
+                await asyncio.to_thread(self._db.close)
+                self._db = None
+
+    async def _drain(self):
+        # Keep going while whole batches are written; failed entries wait for their next attempt
+        while await self.flush() == self.batch_max:
+            pass
+
+    async def _send(self, payloads: list) -> list:
+        """``(event, error)`` per payload, in order."""
+        if len(payloads) == 1:
+            tool = TOOLS["create_event"]
+            return [(await self.canister.call(tool.name, **tool.request(payloads[0])), None)]
+        tool = TOOLS["create_events_bulk"]
+        result = await self.canister.call(tool.name, **tool.request({"events": payloads}))
+        outcomes = [(None, "No result from the canister")] * len(payloads)
+        for item in result.get("results", []):
+            index = item.get("index")
+            if isinstance(index, int) and 0 <= index < len(payloads):
+                outcomes[index] = (item.get("event"), None) if item.get("success") else (None, item.get("error"))
+        return outcomes
+
+    def _resolve(self, key: str):
+        waiter = self._waiters.pop(key, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _run(self, func, *args):
+        async with self._db_lock:
+            return await asyncio.to_thread(self._locked, func, *args)
+
+    # Everything below runs in a worker thread, under _db_lock
+
+    def _locked(self, func, *args):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(SCHEMA)
+            self._db.commit()
+        result = func(*args)
+        self.pending = self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+        return result
+
+    def _insert(self, payload: dict) -> bool:
+        now = time.time()
+        cursor = self._db.execute(INSERT, (payload["idempotency_key"], json.dumps(payload), now, now))
+        self._db.commit()
+        return cursor.rowcount > 0
+
+    def _entry(self, key: str) -> dict:
+        status, payload, result, error = self._db.execute(
+            "SELECT status, payload, result, error FROM outbox WHERE key = ?", (key,)
+        ).fetchone()
+        return {"status": status, "payload": json.loads(payload), "result": result and json.loads(result),
+                "error": error}
+
+    def _due(self) -> list:
+        return self._db.execute(
+            "SELECT key, payload, attempts FROM outbox WHERE status = ? AND next_attempt <= ?"
+            " ORDER BY created_at LIMIT ?",
+            (PENDING, time.time(), self.batch_max),
+        ).fetchall()
+
+    def _settle(self, settled: list):
+        for key, event, error in settled:
+            if event is not None:
+                self._db.execute("UPDATE outbox SET status = ?, attempts = attempts + 1, result = ? WHERE key = ?",
+                                 (SENT, json.dumps(event), key))
+            else:
+                self._db.execute("UPDATE outbox SET status = ?, attempts = attempts + 1, error = ? WHERE key = ?",
+                                 (FAILED, error, key))
+        self._db.commit()
+
+    def _reschedule(self, rows: list):
+        now = time.time()
+        for key, _, attempts in rows:
+            delay = min(self.backoff_max, self.backoff * 2 ** attempts)
+            self._db.execute("UPDATE outbox SET attempts = attempts + 1, next_attempt = ? WHERE key = ?",
+                             (now + delay, key))
+        self._db.commit()
+
+    def _prune(self, cutoff: float) -> int:
+        cursor = self._db.execute("DELETE FROM outbox WHERE status != ? AND created_at < ?", (PENDING, cutoff))
+        self._db.commit()
+        return cursor.rowcount
@@ -0,0 +1,103 @@
+# payment_links.py
+import os
+import asyncio
+from collections import Counter
+from cache import TTLCache, key_part
+from canister import CanisterClient
+from event_pages import count_events
+from tool_registry import TOOLS
+
+# A link rarely changes for an event; past the TTL it is still served once while it is refreshed
+PAYMENT_LINK_TTL = float(os.getenv("PAYMENT_LINK_TTL", "600"))
+PAYMENT_LINK_CACHE_SIZE = int(os.getenv("PAYMENT_LINK_CACHE_SIZE", "4096"))
+# The prewarmer keeps links for the most requested and the newest events in memory
+PAYMENT_PREWARM_INTERVAL = float(os.getenv("PAYMENT_PREWARM_INTERVAL", "60"))
+PAYMENT_PREWARM_TOP = int(os.getenv("PAYMENT_PREWARM_TOP", "20"))
+PAYMENT_PREWARM_NEWEST = int(os.getenv("PAYMENT_PREWARM_NEWEST", "20"))
+PAYMENT_PREWARM_CONCURRENCY = int(os.getenv("PAYMENT_PREWARM_CONCURRENCY", "8"))
+
+
+class PaymentLinkCache:
+    """``GET /payment/:id`` results by event ID, with demand tracking and a prewarmer.
+
+    Serves as the ``payment`` handler of a ``ToolSet``:
+
+        links = PaymentLinkCache(canister)
+        toolset = ToolSet(["payment"], canister, handlers={"payment": links.handler})
+
+    ``prewarm`` loads the links of the ``top`` most requested events and of
+    the ``newest`` events (the last page of the date-ordered events list)
+    that are not fresh in the cache. Request counts are halved on every
+    prewarm, so "most requested" follows recent demand. ``invalidate`` drops
+    one link or all of them.
+    """
+
+    def __init__(self, canister: CanisterClient, ttl: float = PAYMENT_LINK_TTL, maxsize: int = PAYMENT_LINK_CACHE_SIZE,
+                 top: int = PAYMENT_PREWARM_TOP, newest: int = PAYMENT_PREWARM_NEWEST,
+                 concurrency: int = PAYMENT_PREWARM_CONCURRENCY):
+        self.canister = canister
+        self.cache = TTLCache(maxsize, ttl, stale_ttl=ttl)
+        self.top = top
+        self.newest = newest
+        self.concurrency = max(1, concurrency)
+        self.demand = Counter()
+        self.stats = {"prewarms": 0, "prewarmed": 0, "prewarm_errors": 0, "invalidations": 0}
+
+    async def get(self, event_id) -> dict:
+        key = key_part(event_id)
+        self.demand[key] += 1
+        return await self.cache.get_or_load(key, lambda: self._load(key))
+
+    async def handler(self, arguments: dict) -> dict:
+        return await self.get(arguments.get("eventId"))
+
+    def invalidate(self, event_id=None) -> int:
+        """Drop the link for ``event_id``, or every link when it is None; returns how many were dropped."""
+        self.stats["invalidations"] += 1
+        if event_id is None:
+            dropped = len(self.cache)
+            self.cache.clear()
+            return dropped
+        return int(self.cache.discard(key_part(event_id)))
+
+    async def prewarm(self) -> int:
+        """Load the links of hot events that are missing or stale; returns how many were loaded."""
+        self.stats["prewarms"] += 1
+        ids = [key for key, _ in self.demand.most_common(self.top)]
+        if self.newest > 0:
+            ids += await self._newest_ids()
+        self.demand = Counter({key: count // 2 for key, count in self.demand.most_common(self.top * 10) if count > 1})
+
+        ids = [key for key in dict.fromkeys(ids) if self.cache.get(key)[0] != "fresh"]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm(key: str) -> bool:
+            async with semaphore:
+                generation = self.cache.generation
+                try:
+                    link = await self._load(key)
+                except Exception:
+                    self.stats["prewarm_errors"] += 1
+                    return False
+                if generation == self.cache.generation:
+                    self.cache.set(key, link)
+                return True
+
+        loaded = sum(await asyncio.gather(*(warm(key) for key in ids)))
+        self.stats["prewarmed"] += loaded
+        return loaded
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, links=len(self.cache), cache=self.cache.stats, tracked=len(self.demand))
+
+    async def _newest_ids(self) -> list:
+        total = await count_events(self.canister)
+        events = await self.canister.call(
+            "get_events", "GET", "/events",
+            params={"limit": self.newest, "offset": max(0, total - self.newest)},
+        )
+        return [key_part(event["id"]) for event in events or [] if event and event.get("id") is not None]
+
+    async def _load(self, key: str) -> dict:
+        tool = TOOLS["payment"]
+        return await self.canister.call(tool.name, **tool.request({"eventId": key}))
@@ -0,0 +1,144 @@
+# response_cache.py
+import os
+import re
+import json
+import time
+from collections import OrderedDict
+from cache import TTLCache, event_cache, key_part
+from tool_registry import READ_ONLY_TOOLS
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+# Jaccard similarity over character trigrams for near-duplicate queries; 0 disables
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+NON_WORD = re.compile(r"[^a-z0-9]+")
+NUMBER = re.compile(r"\d+")
+
+
+def normalize(query: str) -> str:
+    return NON_WORD.sub(" ", query.lower()).strip()
+
+
+def tool_calls_key(tool_calls: list) -> list:
+    """``[name, arguments]`` per call, with arguments in their cache-key form."""
+    return [
+        [tool_call["function"]["name"], key_part(json.loads(tool_call["function"]["arguments"] or "{}"))]
+        for tool_call in tool_calls
+    ]
+
+
+def tool_signature(tool_calls: list) -> str:
+    """Canonical form of a turn's tool calls, independent of call ids and argument order."""
+    return json.dumps(tool_calls_key(tool_calls), sort_keys=True)
+
+
+def trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(hash(padded[i:i + 3]) for i in range(len(padded) - 2))
+
+
+class ResponseCache:
+    """Final answers keyed by normalized query text and by resolved tool calls.
+
+    Entries are tied to ``source`` (the event cache): they never live longer
+    than its TTL and are dropped as soon as it is cleared by a write. Only
+    turns made entirely of read-only tool calls are stored. Only
+    ``templated`` answers, which depend on the tool results and not on how
+    the question was asked, are shared by tool calls. Results cached
+    elsewhere, such as payment links, are dropped with ``invalidate``.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY, source: TTLCache = event_cache):
+        self.maxsize = maxsize
+        self.ttl = min(ttl, source.ttl)
+        self.similarity = similarity
+        self.source = source
+        self.stats = {"hits": 0, "signature_hits": 0, "similar_hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._by_signature = {}
+
+    def get(self, query: str):
+        """Look up an answer by query text, exact first and then by similarity."""
+        key = normalize(query)
+        entry = self._live(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry["answer"]
+        if self.similarity > 0:
+            key = self._similar(key)
+            if key is not None:
+                self.stats["similar_hits"] += 1
+                return self._entries[key]["answer"]
+        self.stats["misses"] += 1
+        return None
+
+    def get_by_signature(self, tool_calls: list):
+        """Look up a templated answer for a differently phrased query that resolved to the same tools."""
+        key = self._by_signature.get(tool_signature(tool_calls))
+        if key is None or self._live(key) is None:
+            return None
+        self.stats["signature_hits"] += 1
+        return self._entries[key]["answer"]
+
+    def put(self, query: str, tool_calls: list, answer: str, templated: bool = False):
+        if not tool_calls or any(tc["function"]["name"] not in READ_ONLY_TOOLS for tc in tool_calls):
+            return
+        key = normalize(query)
+        signature = tool_signature(tool_calls)
+        self._entries[key] = {
+            "answer": answer,
+            "signature": signature if templated else None,
+            "generation": self.source.generation,
+            "stored_at": time.monotonic(),
+            "grams": trigrams(key) if self.similarity > 0 else None,
+            "numbers": NUMBER.findall(key),
+            "calls": tool_calls_key(tool_calls),
+        }
+        self._entries.move_to_end(key)
+        if templated:
+            self._by_signature[signature] = key
+        while len(self._entries) > self.maxsize:
+            old_key, old = self._entries.popitem(last=False)
+            if self._by_signature.get(old["signature"]) == old_key:
+                del self._by_signature[old["signature"]]
+
+    def invalidate(self, name: str, arguments: dict = None) -> int:
+        """Drop answers built from a ``name`` call, or only from those called with ``arguments``; returns how many."""
+        wanted = key_part(arguments or {})
+        stale = [
+            key for key, entry in self._entries.items()
+            if any(call == name and all(args.get(k) == v for k, v in wanted.items()) for call, args in entry["calls"])
+        ]
+        for key in stale:
+            self._drop(key)
+        return len(stale)
+
+    def _live(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["generation"] != self.source.generation or time.monotonic() - entry["stored_at"] > self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        if self._by_signature.get(entry["signature"]) == key:
+            del self._by_signature[entry["signature"]]
+
+    def _similar(self, key: str):
+        grams = trigrams(key)
+        # IDs and limits must match exactly; "event 5" is never "event 6"
+        numbers = NUMBER.findall(key)
+        best_key, best_score = None, self.similarity
+        for other_key, entry in list(self._entries.items()):
+            if entry["numbers"] != numbers or entry["grams"] is None:
+                continue
+            score = len(grams & entry["grams"]) / len(grams | entry["grams"])
+            if score >= best_score and self._live(other_key) is not None:
+                best_key, best_score = other_key, score
+        return best_key
@@ -0,0 +1,50 @@
+# responses.py
+import os
+from tool_registry import TOOLS
+
+TEMPLATE = "template"  # return the locally formatted tool output as the answer
+LLM = "llm"            # let ASI1 phrase the answer from the tool output
+AUTO = "auto"          # template when there is exactly one successful tool call
+
+DEFAULT_RESPONSE_MODE = os.getenv("RESPONSE_MODE", AUTO)
+
+# Sent instead of an ASI1 answer while ASI1 is unreachable
+UNAVAILABLE_MESSAGE = ("The AI assistant is temporarily unavailable. Plain commands such as "
+                       "\"list events\" or \"show event 5\" still work, please retry anything else shortly.")
+DEGRADED_NOTE = "⚠️ The AI assistant is temporarily unavailable, here is the raw result:"
+
+# Per-tool override, e.g. RESPONSE_MODE_GET_EVENTS=llm
+RESPONSE_MODES = {
+    name: os.getenv(f"RESPONSE_MODE_{name.upper()}", DEFAULT_RESPONSE_MODE)
+    for name in TOOLS
+}
+
+
+def template_response(tool_calls: list, tool_messages: list, failed: set):
+    """Return the final answer built from ``tool_messages``, or None to ask ASI1.
+
+    Every call's mode must allow a template. Failed calls always go to ASI1 so
+    it can explain the error instead of echoing raw JSON.
+    """
+    if failed or not uses_template(tool_calls):
+        return None
+    return "\n\n".join(message["content"] for message in tool_messages)
+
+
+def uses_template(tool_calls: list) -> bool:
+    """Whether ``template_response`` will answer these calls if none of them fail.
+
+    When it won't, tool output is only read by ASI1 and can use the compact encoding.
+    """
+    if not tool_calls:
+        return False
+    modes = {RESPONSE_MODES.get(tool_call["function"]["name"], DEFAULT_RESPONSE_MODE) for tool_call in tool_calls}
+    if LLM in modes:
+        return False
+    return not (AUTO in modes and len(tool_calls) != 1)
+
+
+def degraded_response(tool_messages: list) -> str:
+    """Final answer built from raw tool output when ASI1 cannot be reached."""
+    body = "\n\n".join(message["content"] for message in tool_messages)
+    return f"{DEGRADED_NOTE}\n\n{body}"
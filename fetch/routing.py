@@ -0,0 +1,263 @@
+# routing.py
+import os
+import re
+import time
+import random
+import asyncio
+from collections import deque
+
+# Sub-agent reply timeout, and the hedge budget used until enough latencies are recorded
+COORDINATOR_TIMEOUT = int(os.getenv("COORDINATOR_TIMEOUT", "30"))
+HEDGE_DEFAULT_BUDGET = float(os.getenv("HEDGE_DEFAULT_BUDGET", "5"))
+HEDGE_MIN_BUDGET = float(os.getenv("HEDGE_MIN_BUDGET", "0.5"))
+HEDGE_MIN_SAMPLES = 20
+
+# Worker health: ping period and timeout, misses before draining, and how long a
+# drained worker may stay unreachable before it is dropped from the registry
+WORKER_HEALTH_INTERVAL = float(os.getenv("WORKER_HEALTH_INTERVAL", "15"))
+WORKER_PING_TIMEOUT = int(os.getenv("WORKER_PING_TIMEOUT", "5"))
+WORKER_MAX_FAILURES = int(os.getenv("WORKER_MAX_FAILURES", "3"))
+WORKER_REMOVE_AFTER = float(os.getenv("WORKER_REMOVE_AFTER", "600"))
+
+EVENT = "event"
+PAYMENT = "payment"
+
+PAYMENT_WORDS = re.compile(r"\b(?:pay|payment|checkout|buy|purchase|ticket link)\b", re.IGNORECASE)
+EVENT_WORDS = re.compile(
+    r"\b(?:events?|list|show|details?|info(?:rmation)?|create|search|find|canister|address)\b", re.IGNORECASE
+)
+CONJUNCTION = re.compile(r"\b(?:and|also|then|plus)\b|[,;]", re.IGNORECASE)
+# Anything that may change canister state; a duplicate of it could run twice
+WRITE_WORDS = re.compile(
+    r"\b(?:create|new|add|make|schedule|organi[sz]e|host|set up|update|edit|change|delete|remove|cancel)\b",
+    re.IGNORECASE,
+)
+
+
+def classify(query: str) -> list:
+    """Return the roles that should see ``query``.
+
+    Payment wording goes to the payment agent. It is also sent to the event
+    agent when the query joins an event request to it ("show event 5 and give
+    me its payment link"). Everything else goes to the event agent.
+    """
+    if not PAYMENT_WORDS.search(query):
+        return [EVENT]
+    clauses = [c for c in CONJUNCTION.split(query) if c.strip()]
+    if len(clauses) > 1 and any(EVENT_WORDS.search(c) and not PAYMENT_WORDS.search(c) for c in clauses):
+        return [EVENT, PAYMENT]
+    return [PAYMENT]
+
+
+def is_read(query: str) -> bool:
+    """Whether ``query`` only reads, so a hedged duplicate of it is harmless."""
+    return not WRITE_WORDS.search(query)
+
+
+class LatencyTracker:
+    """Recent reply latencies per sub-agent address, for the hedging budget."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+
+    def observe(self, address: str, seconds: float):
+        self._samples.setdefault(address, deque(maxlen=self.window)).append(seconds)
+
+    def p95(self, address: str):
+        samples = self._samples.get(address)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def budget(self, address: str) -> float:
+        p95 = self.p95(address)
+        return max(HEDGE_MIN_BUDGET, p95 if p95 is not None else HEDGE_DEFAULT_BUDGET)
+
+
+class Worker:
+    def __init__(self, address: str):
+        self.address = address
+        self.outstanding = 0
+        self.failures = 0
+        self.healthy = True
+        self.draining = False
+        self.reported_load = 0
+        self.down_since = None
+
+    def snapshot(self) -> dict:
+        return {
+            "address": self.address,
+            "outstanding": self.outstanding,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "failures": self.failures,
+            "reported_load": self.reported_load,
+        }
+
+
+class WorkerPool:
+    """Agent addresses that can serve one role, with load and health state.
+
+    ``choose`` uses power-of-two-choices on outstanding requests. Workers that
+    miss ``WORKER_MAX_FAILURES`` pings or replies in a row stop receiving
+    traffic. They come back on the next successful ping, or are dropped after
+    ``WORKER_REMOVE_AFTER`` seconds. An operator can also drain a worker by
+    hand. The last worker of a role is never dropped.
+    """
+
+    def __init__(self, addresses: list):
+        self.workers = {}
+        for address in addresses:
+            self.add(address)
+
+    def add(self, address: str) -> Worker:
+        worker = self.workers.get(address)
+        if worker is None:
+            worker = self.workers[address] = Worker(address)
+        worker.draining = False
+        return worker
+
+    def drain(self, address: str) -> bool:
+        worker = self.workers.get(address)
+        if worker is None:
+            return False
+        worker.draining = True
+        return True
+
+    def remove(self, address: str) -> bool:
+        if address not in self.workers or len(self.workers) == 1:
+            return False
+        del self.workers[address]
+        return True
+
+    def available(self) -> list:
+        return [w for w in self.workers.values() if w.healthy and not w.draining]
+
+    def choose(self) -> list:
+        """Addresses in try order: a power-of-two-choices pick, then the least loaded other."""
+        candidates = self.available() or list(self.workers.values())
+        if len(candidates) > 2:
+            first = min(random.sample(candidates, 2), key=lambda w: w.outstanding)
+        else:
+            first = min(candidates, key=lambda w: w.outstanding)
+        rest = sorted((w for w in candidates if w is not first), key=lambda w: w.outstanding)
+        return [first.address] + [w.address for w in rest]
+
+    def record(self, address: str, ok: bool):
+        worker = self.workers.get(address)
+        if worker is None:
+            return
+        if ok:
+            worker.failures = 0
+            worker.healthy = True
+            worker.down_since = None
+            return
+        worker.failures += 1
+        if worker.failures >= WORKER_MAX_FAILURES and worker.healthy:
+            worker.healthy = False
+            worker.down_since = time.monotonic()
+
+    def prune(self) -> list:
+        """Drop workers that have been unhealthy longer than ``WORKER_REMOVE_AFTER``."""
+        now = time.monotonic()
+        dead = [w.address for w in self.workers.values()
+                if not w.healthy and now - w.down_since > WORKER_REMOVE_AFTER]
+        return [address for address in dead if self.remove(address)]
+
+    def snapshot(self) -> list:
+        return [w.snapshot() for w in self.workers.values()]
+
+
+class RoutingEngine:
+    """Fans a query out to the sub-agent roles it needs and hedges slow replies.
+
+    ``roles`` maps a role to its worker addresses. ``ask(address)`` is
+    supplied per request and must return ``(text or None, status)``.
+    Each role's WorkerPool picks the worker. When that worker has not answered
+    within its p95 budget, a duplicate goes to the next worker of the role and
+    the first answer wins. Only reads are hedged; a query that may write goes
+    to a single worker, so it cannot run twice. Hedging needs a second worker: uagents pairs
+    replies by destination within a session, so the same agent cannot be asked
+    twice at once.
+    """
+
+    def __init__(self, roles: dict):
+        self.pools = {role: WorkerPool(addresses) for role, addresses in roles.items()}
+        self.latency = LatencyTracker()
+        self.stats = {"dispatched": 0, "fan_out": 0, "writes": 0, "hedges": 0, "hedge_wins": 0}
+
+    async def dispatch(self, query: str, ask):
+        """Return ``(merged_text, statuses)``; merged_text is None if no sub-agent answered."""
+        roles = classify(query)
+        self.stats["dispatched"] += 1
+        if len(roles) > 1:
+            self.stats["fan_out"] += 1
+        hedge = is_read(query)
+        if not hedge:
+            self.stats["writes"] += 1
+        results = await asyncio.gather(*(self._ask_role(role, ask, hedge) for role in roles))
+        texts = [text for text, _ in results if text]
+        statuses = [status for _, status in results]
+        return ("\n\n".join(texts) if texts else None), statuses
+
+    async def health_check(self, ping) -> list:
+        """Ping every worker concurrently; ``ping(address)`` returns the worker's load or None.
+
+        Returns the addresses removed from the registry.
+        """
+        workers = [(pool, worker) for pool in self.pools.values() for worker in list(pool.workers.values())]
+        loads = await asyncio.gather(*(ping(worker.address) for _, worker in workers), return_exceptions=True)
+        for (pool, worker), load in zip(workers, loads):
+            ok = load is not None and not isinstance(load, Exception)
+            if ok:
+                worker.reported_load = load
+            pool.record(worker.address, ok)
+        return [address for pool in self.pools.values() for address in pool.prune()]
+
+    def snapshot(self) -> dict:
+        return {role: pool.snapshot() for role, pool in self.pools.items()}
+
+    async def _ask_role(self, role: str, ask, hedge: bool = True):
+        pool = self.pools[role]
+        addresses = pool.choose()
+        if not hedge or len(addresses) < 2:
+            return await self._timed(pool, addresses[0], ask)
+        primary = asyncio.create_task(self._timed(pool, addresses[0], ask))
+        done, _ = await asyncio.wait({primary}, timeout=self.latency.budget(addresses[0]))
+        if done:
+            return await primary
+
+        self.stats["hedges"] += 1
+        hedge = asyncio.create_task(self._timed(pool, addresses[1], ask))
+        pending = {primary, hedge}
+        result = None, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result[0] is not None:
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _timed(self, pool: WorkerPool, address: str, ask):
+        worker = pool.workers.get(address)
+        if worker is not None:
+            worker.outstanding += 1
+        started = time.monotonic()
+        try:
+            text, status = await ask(address)
+        finally:
+            if worker is not None:
+                worker.outstanding -= 1
+        if text is not None:
+            self.latency.observe(address, time.monotonic() - started)
+        pool.record(address, text is not None)
+        return text, status
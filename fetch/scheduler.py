@@ -0,0 +1,170 @@
+# scheduler.py
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from metrics import metrics
+
+INTERACTIVE = "interactive"  # REST /chat and /chat/stream
+CHAT = "chat"                # chat protocol and coordinator messages
+BACKGROUND = "background"    # bulk tool calls, prewarming, index refreshes
+CLASSES = (INTERACTIVE, CHAT, BACKGROUND)
+
+# Most jobs of each class that may run at once
+SCHEDULER_BUDGETS = {
+    INTERACTIVE: int(os.getenv("SCHEDULER_BUDGET_INTERACTIVE", "32")),
+    CHAT: int(os.getenv("SCHEDULER_BUDGET_CHAT", "32")),
+    BACKGROUND: int(os.getenv("SCHEDULER_BUDGET_BACKGROUND", "4")),
+}
+# Share of dispatches each class gets while several are waiting
+SCHEDULER_WEIGHTS = {
+    INTERACTIVE: float(os.getenv("SCHEDULER_WEIGHT_INTERACTIVE", "8")),
+    CHAT: float(os.getenv("SCHEDULER_WEIGHT_CHAT", "4")),
+    BACKGROUND: float(os.getenv("SCHEDULER_WEIGHT_BACKGROUND", "1")),
+}
+
+# The job the current task runs in, so nested background work is charged to the same sender
+current_job = ContextVar("current_job", default=None)
+
+
+class Job:
+    __slots__ = ("job_class", "sender", "finish", "future", "enqueued", "started")
+
+    def __init__(self, job_class: str, sender):
+        self.job_class = job_class
+        self.sender = sender
+        self.finish = 0.0
+        self.future = None
+        self.enqueued = time.monotonic()
+        self.started = None
+
+
+class Scheduler:
+    """Weighted fair queuing of jobs by class and sender, with a concurrency budget per class.
+
+        async with scheduler.slot(CHAT, sender):
+            reply = await process_query(...)
+
+    Each (class, sender) pair is a flow. A queued job is tagged with a
+    virtual finish time of ``max(now, flow's last tag) + 1 / class weight``,
+    and the smallest tag among classes under budget runs next. A sender
+    flooding the queue only delays itself, and a bulk backlog gets one slot
+    in ``weight`` sum while interactive work waits. ``limit``, when set, caps
+    interactive and chat jobs together; background jobs only count against
+    their own budget, so bulk work started inside a query cannot deadlock it.
+    """
+
+    def __init__(self, limit: int = None, budgets: dict = None, weights: dict = None):
+        self.limit = limit
+        self.budgets = dict(SCHEDULER_BUDGETS, **(budgets or {}))
+        self.weights = dict(SCHEDULER_WEIGHTS, **(weights or {}))
+        self.active = {c: 0 for c in CLASSES}
+        self.queued = {c: 0 for c in CLASSES}
+        self.stats = {c: {"dispatched": 0, "queued": 0, "max_depth": 0} for c in CLASSES}
+        self.virtual = 0.0
+        self._queues = {c: [] for c in CLASSES}
+        self._last_finish = {}
+        self._seq = itertools.count()
+
+    def waiting(self, *classes) -> int:
+        return sum(self.queued[c] for c in classes or CLASSES)
+
+    def ready(self, job_class: str) -> bool:
+        """Whether a job of ``job_class`` would start without queuing."""
+        return not self._queues[job_class] and self._can_run(job_class)
+
+    async def acquire(self, job_class: str, sender=None, timeout: float = None) -> Job:
+        """Wait for a slot of ``job_class``; pair with ``release``.
+
+        ``sender`` defaults to the sender of the job this task already runs in.
+        Raises ``asyncio.TimeoutError`` if no slot frees up within ``timeout``.
+        """
+        if sender is None and current_job.get() is not None:
+            sender = current_job.get().sender
+        job = Job(job_class, sender)
+        if self.ready(job_class):
+            self._start(job)
+            return job
+
+        flow = (job_class, sender)
+        job.finish = max(self.virtual, self._last_finish.get(flow, 0.0)) + 1 / self.weights[job_class]
+        self._last_finish[flow] = job.finish
+        job.future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[job_class], (job.finish, next(self._seq), job))
+        self.queued[job_class] += 1
+        stats = self.stats[job_class]
+        stats["queued"] += 1
+        stats["max_depth"] = max(stats["max_depth"], self.queued[job_class])
+        self._dispatch()
+        try:
+            await asyncio.wait_for(job.future, timeout)
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the wait was cancelled
+            if job.future.done() and not job.future.cancelled():
+                self.release(job)
+            raise
+        finally:
+            if job.started is None:
+                self.queued[job_class] -= 1
+                if self._last_finish.get(flow) == job.finish:
+                    del self._last_finish[flow]
+        return job
+
+    def release(self, job: Job):
+        self.active[job.job_class] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, job_class: str, sender=None, timeout: float = None):
+        job = await self.acquire(job_class, sender, timeout)
+        token = current_job.set(job)
+        try:
+            yield job
+        finally:
+            current_job.reset(token)
+            self.release(job)
+
+    def snapshot(self) -> dict:
+        return {
+            c: dict(self.stats[c], active=self.active[c], depth=self.queued[c], budget=self.budgets[c])
+            for c in CLASSES
+        }
+
+    def _can_run(self, job_class: str) -> bool:
+        if self.active[job_class] >= self.budgets[job_class]:
+            return False
+        if self.limit is not None and job_class != BACKGROUND:
+            return self.active[INTERACTIVE] + self.active[CHAT] < self.limit
+        return True
+
+    def _start(self, job: Job):
+        job.started = time.monotonic()
+        self.active[job.job_class] += 1
+        self.stats[job.job_class]["dispatched"] += 1
+        metrics.observe(f"queue.{job.job_class}", job.started - job.enqueued)
+
+    def _dispatch(self):
+        while True:
+            heads = []
+            for c in CLASSES:
+                queue = self._queues[c]
+                # Drop waiters that timed out or were cancelled
+                while queue and queue[0][2].future.done():
+                    heapq.heappop(queue)
+                if queue and self._can_run(c):
+                    heads.append(queue[0])
+            if not heads:
+                return
+            finish, _, job = min(heads)
+            heapq.heappop(self._queues[job.job_class])
+            self.virtual = finish
+            flow = (job.job_class, job.sender)
+            if self._last_finish.get(flow) == finish:
+                # Last queued job of this flow, forget it
+                del self._last_finish[flow]
+            self.queued[job.job_class] -= 1
+            self._start(job)
+            job.future.set_result(job)
@@ -0,0 +1,179 @@
+# sessions.py
+import os
+import re
+import json
+import time
+import asyncio
+from collections import OrderedDict
+
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+# Rough prompt budget for the history replayed to ASI1, in tokens (~4 characters each)
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "2000"))
+SESSION_MAX_EVENTS = int(os.getenv("SESSION_MAX_EVENTS", "20"))
+# JSON file the sessions are saved to and restored from; empty keeps them in memory only
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "")
+SESSION_SAVE_INTERVAL = float(os.getenv("SESSION_SAVE_INTERVAL", "60"))
+
+# "pay for that one", "book it", "show this event again"; a bare "it" only as the object of an event action,
+# so "is it possible to ..." is left alone
+REFERENCE = re.compile(
+    r"\b(?:(?:that|this|the same) (?:one|event)|(?P<verb>(?:pay|book|buy|purchase|reserve|register|show|open|view|"
+    r"describe|cancel|about|of|for)\s+)it)\b",
+    re.IGNORECASE,
+)
+EVENT_REF = re.compile(r"\bevents?\s*(?:id\s*)?#?(\d+)", re.IGNORECASE)
+FOLLOW_UP = re.compile(r"\b(?:that|this|those|these|them|it|same|again|previous|last)\b", re.IGNORECASE)
+
+SUMMARY_CHARS = 80
+
+
+def estimate_tokens(messages: list) -> int:
+    return sum(len(m.get("content") or "") + len(json.dumps(m.get("tool_calls") or "")) for m in messages) // 4
+
+
+class Session:
+    """One sender's recent turns and the events they have looked at.
+
+    A turn is the list of messages one query produced: the user message, the
+    assistant tool calls, the tool results and the final answer. Turns are
+    only dropped whole, so every replayed tool result still has its call.
+    """
+
+    def __init__(self, turns: list = None, events: dict = None, updated_at: float = None):
+        self.turns = turns or []
+        self.events = OrderedDict(events or {})
+        self.updated_at = updated_at or time.time()
+
+    def history(self) -> list:
+        return [message for turn in self.turns for message in turn]
+
+    def add_turn(self, messages: list, budget: int = SESSION_TOKEN_BUDGET):
+        self.turns.append(messages)
+        self.updated_at = time.time()
+        self.compact(budget)
+
+    def compact(self, budget: int = SESSION_TOKEN_BUDGET):
+        """Shrink the history to ``budget`` tokens.
+
+        Tool outputs and answers are cut to a one-line summary first, oldest turn first,
+        then the oldest turns are dropped. The latest turn is always kept.
+        """
+        for turn in self.turns:
+            if estimate_tokens(self.history()) <= budget:
+                return
+            for message in turn:
+                content = message.get("content") or ""
+                if message["role"] != "user" and len(content) > SUMMARY_CHARS:
+                    lines = content.count("\n") + 1
+                    message["content"] = f"{content[:SUMMARY_CHARS]}... [{lines} lines omitted]"
+        while len(self.turns) > 1 and estimate_tokens(self.history()) > budget:
+            self.turns.pop(0)
+
+    def remember(self, event: dict):
+        if not isinstance(event, dict) or event.get("id") is None:
+            return
+        key = str(event["id"])
+        self.events[key] = event
+        self.events.move_to_end(key)
+        while len(self.events) > SESSION_MAX_EVENTS:
+            self.events.popitem(last=False)
+
+    def note_references(self, query: str):
+        """Remember events named in ``query`` even when the answer came from a cache."""
+        for event_id in EVENT_REF.findall(query):
+            self.remember(self.events.get(event_id) or {"id": event_id})
+
+    @property
+    def last_event_id(self):
+        return next(reversed(self.events), None)
+
+    def resolve(self, query: str) -> str:
+        """Replace "that one" / "book it" with the last event this sender looked at.
+
+        A query that names an event itself ("show event 7 and pay for it") is left as is.
+        """
+        event_id = self.last_event_id
+        if event_id is None or EVENT_REF.search(query):
+            return query
+        return REFERENCE.sub(lambda m: f"{m.group('verb') or ''}event {event_id}", query)
+
+    def is_follow_up(self, query: str) -> bool:
+        """True if ``query`` may depend on earlier turns, so answers must not be shared."""
+        return bool(self.turns) and bool(FOLLOW_UP.search(query))
+
+    def to_dict(self) -> dict:
+        # Copies of the lists that grow, so the result can be encoded off the event loop
+        return {"turns": [list(turn) for turn in self.turns], "events": list(self.events.items()),
+                "updated_at": self.updated_at}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        return cls(data.get("turns"), data.get("events"), data.get("updated_at"))
+
+
+class SessionStore:
+    """Sessions keyed by sender address, bounded by count (LRU) and idle time (TTL)."""
+
+    def __init__(self, maxsize: int = SESSION_MAX, ttl: float = SESSION_TTL, path: str = SESSION_STORE_PATH):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._sessions = OrderedDict()
+        self._save_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, sender: str) -> bool:
+        session = self._sessions.get(sender)
+        return session is not None and time.time() - session.updated_at <= self.ttl
+
+    def get(self, sender: str) -> Session:
+        session = self._sessions.get(sender)
+        if session is None or time.time() - session.updated_at > self.ttl:
+            session = self._sessions[sender] = Session()
+        self._sessions.move_to_end(sender)
+        while len(self._sessions) > self.maxsize:
+            self._sessions.popitem(last=False)
+        return session
+
+    def start(self, sender: str) -> Session:
+        self._sessions.pop(sender, None)
+        return self.get(sender)
+
+    def end(self, sender: str):
+        self._sessions.pop(sender, None)
+
+    def prune(self) -> int:
+        now = time.time()
+        expired = [sender for sender, s in self._sessions.items() if now - s.updated_at > self.ttl]
+        for sender in expired:
+            del self._sessions[sender]
+        return len(expired)
+
+    async def save(self):
+        """Write the sessions to ``path``; they are copied on the loop, encoded and written in a worker thread."""
+        if not self.path:
+            return
+        data = {sender: s.to_dict() for sender, s in self._sessions.items()}
+        async with self._save_lock:
+            await asyncio.to_thread(self._write, data)
+
+    async def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        data = await asyncio.to_thread(self._read)
+        for sender, session in data.items():
+            self._sessions[sender] = Session.from_dict(session)
+        self.prune()
+
+    def _write(self, data: dict):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def _read(self) -> dict:
+        with open(self.path) as f:
+            return json.load(f)
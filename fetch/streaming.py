@@ -0,0 +1,141 @@
+# streaming.py
+import os
+import time
+import asyncio
+from uuid import uuid4
+from datetime import datetime, timezone
+from uagents_core.contrib.protocols.chat import (
+    ChatMessage,
+    TextContent,
+    StartStreamContent,
+    EndStreamContent,
+)
+
+# Stream final answers to chat-protocol clients instead of one message at the end
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+# Coalesce token deltas so each ChatMessage envelope carries a useful chunk
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "80"))
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.25"))
+# How long a REST poll waits for new text, and how long finished streams are kept
+STREAM_POLL_TIMEOUT = float(os.getenv("STREAM_POLL_TIMEOUT", "10"))
+STREAM_TTL = float(os.getenv("STREAM_TTL", "300"))
+
+
+class StreamInterrupted(Exception):
+    """The answer stream broke after part of it was already sent."""
+
+
+def interrupted_note(error: str) -> str:
+    return f"\n\n[The answer was cut off: {error}]"
+
+
+class ChatStream:
+    """Forwards answer deltas to a chat-protocol peer as a bracketed stream.
+
+    ``send(content)`` delivers one ChatMessage content list. The first flush
+    carries StartStreamContent, ``close`` sends the remainder with
+    EndStreamContent.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.stream_id = uuid4()
+        self.started = False
+        self._buffer = ""
+        self._last_flush = time.monotonic()
+
+    async def write(self, delta: str):
+        self._buffer += delta
+        if len(self._buffer) >= STREAM_FLUSH_CHARS or time.monotonic() - self._last_flush >= STREAM_FLUSH_INTERVAL:
+            await self._flush()
+
+    async def close(self, error: str = None) -> bool:
+        """Finish the stream; returns False if nothing was ever streamed.
+
+        With ``error`` the stream is always sent and ends with a note that
+        the answer was cut off.
+        """
+        if error is not None:
+            self._buffer += interrupted_note(error)
+            if not self.started:
+                await self._flush()
+        if not self.started:
+            return False
+        content = [TextContent(type="text", text=self._buffer)] if self._buffer else []
+        self._buffer = ""
+        await self.send(content + [EndStreamContent(stream_id=self.stream_id)])
+        return True
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        content = [TextContent(type="text", text=self._buffer)]
+        if not self.started:
+            content.insert(0, StartStreamContent(stream_id=self.stream_id))
+            self.started = True
+        self._buffer = ""
+        self._last_flush = time.monotonic()
+        await self.send(content)
+
+
+def chat_message(content: list) -> ChatMessage:
+    return ChatMessage(timestamp=datetime.now(timezone.utc), msg_id=uuid4(), content=content)
+
+
+class StreamBuffer:
+    """Accumulated answer text that REST clients read incrementally by cursor."""
+
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self.error = None
+        self.created_at = time.monotonic()
+        self.task = None
+        self._changed = asyncio.Event()
+
+    async def write(self, delta: str):
+        self.text += delta
+        self._notify()
+
+    def finish(self, error: str = None):
+        """Mark the answer complete; with ``error`` it ends with a note that it was cut off."""
+        if error is not None:
+            self.text += interrupted_note(error)
+            self.error = error
+        self.done = True
+        self._notify()
+
+    async def read(self, cursor: int, timeout: float = STREAM_POLL_TIMEOUT):
+        """Return ``(new_text, next_cursor, done)``, waiting up to ``timeout`` for more text."""
+        if cursor >= len(self.text) and not self.done:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.text[cursor:], len(self.text), self.done
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class StreamRegistry:
+    def __init__(self, ttl: float = STREAM_TTL):
+        self.ttl = ttl
+        self._streams = {}
+
+    def create(self):
+        self._prune()
+        stream_id = str(uuid4())
+        buffer = StreamBuffer()
+        self._streams[stream_id] = buffer
+        return stream_id, buffer
+
+    def get(self, stream_id: str):
+        return self._streams.get(stream_id)
+
+    def _prune(self):
+        now = time.monotonic()
+        for stream_id, buffer in list(self._streams.items()):
+            if buffer.done and now - buffer.created_at > self.ttl:
+                del self._streams[stream_id]
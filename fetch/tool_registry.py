@@ -0,0 +1,418 @@
+# tool_registry.py
+import os
+import json
+import uuid
+import string
+import asyncio
+from cache import event_cache, key_part
+from encoding import ToolResultEncoder
+from scheduler import Scheduler, BACKGROUND
+
+# Seconds sibling single-event lookups wait to be merged into one request; 0 merges those issued together
+EVENT_BATCH_WINDOW = float(os.getenv("EVENT_BATCH_WINDOW", "0"))
+# Matches MAX_LOOKUP_IDS of the canister's GET /events/by-ids
+EVENT_BATCH_MAX = int(os.getenv("EVENT_BATCH_MAX", "100"))
+# get_events pages longer than this run as background work; the canister's default page is 100
+SCHEDULER_BULK_PAGE = int(os.getenv("SCHEDULER_BULK_PAGE", "100"))
+
+
+class Tool:
+    """One tool, declared once: the schema ASI1 sees and how an agent runs it.
+
+    GET tools send the arguments not used in ``path`` as query parameters;
+    other methods send ``body(arguments)`` (the arguments themselves by
+    default) as JSON, unless ``params(arguments)`` builds the query string.
+    ``cache_key`` names the arguments that identify a result in the event
+    cache, None means never cached. ``batch`` names a tool that looks up many
+    ``cache_key`` values in one call; a tool with ``each`` is answered by
+    calling that tool once per value of its ``ids_arg``. Calls for which
+    ``bulk(arguments)`` is true run in a background scheduler slot. ``format`` turns a
+    result into the text shown to the user; ``rows`` gives the records the
+    compact table encodes, and ``records`` the single events a call looked
+    at or created.
+    """
+
+    def __init__(self, name: str, description: str, properties: dict, required: list = (), *,
+                 method: str = "GET", path: str = None, params=None, body=None, read_only: bool = True,
+                 cache_key: tuple = None, batch: str = None, each: str = None, ids_arg: str = None,
+                 bulk=None, is_stale=None, format=None, rows=None, label: str = "events", records=None,
+                 strict: bool = True):
+        self.name = name
+        parameters = {"type": "object", "properties": properties, "required": list(required),
+                      "additionalProperties": False}
+        self.schema = {"type": "function", "function": {"name": name, "description": description,
+                                                        "parameters": parameters}}
+        if strict:
+            self.schema["function"]["strict"] = True
+        self.method = method
+        self.path = path
+        self.path_args = {field for _, field, _, _ in string.Formatter().parse(path or "") if field}
+        self.params = params
+        self.body = body
+        self.read_only = read_only
+        self.cache_key = cache_key
+        self.batch = batch
+        self.each = each
+        self.ids_arg = ids_arg
+        self.bulk = bulk
+        self.is_stale = is_stale
+        self.format = format
+        self.rows = rows
+        self.label = label
+        self.records = records
+
+    def request(self, arguments: dict) -> dict:
+        """Keyword arguments for ``CanisterClient.call``."""
+        request = {"method": self.method, "path": self.path.format(**arguments)}
+        if self.params is not None:
+            request["params"] = self.params(arguments)
+        elif self.method == "GET":
+            params = {k: v for k, v in arguments.items() if k not in self.path_args and v is not None}
+            if params:
+                request["params"] = params
+        else:
+            request["json"] = self.body(arguments) if self.body else arguments
+        return request
+
+
+def _number(value, default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _event_id(key) -> bool:
+    """Whether ``key`` can name an event; the canister answers null for anything else."""
+    return str(key).strip().isdigit()
+
+
+def keyed(event: dict) -> dict:
+    """``event`` with an ``idempotency_key``, a new one per request, so resending it never adds a second event."""
+    return event if event.get("idempotency_key") else dict(event, idempotency_key=uuid.uuid4().hex)
+
+
+def _events(result) -> list:
+    return result if isinstance(result, list) else (result or {}).get("events", [])
+
+
+def format_bulk_result(result: dict, arguments: dict = None) -> str:
+    """One line per item of a ``POST /events/bulk`` response."""
+    lines = [f"✅ Created {result.get('created', 0)} events, {result.get('failed', 0)} failed"]
+    for item in result.get("results", []):
+        if item.get("success"):
+            event = item.get("event") or {}
+            lines.append(f"- #{item.get('index')}: created event {event.get('id')} ({event.get('name')} on {event.get('date')})")
+        else:
+            lines.append(f"- #{item.get('index')}: failed, {item.get('error')}")
+    return "\n".join(lines)
+
+
+def format_events(result, arguments: dict) -> str:
+    return "\n".join(
+        f"- {e.get('name')} | Date: {e.get('date')} | Location: {e.get('location')} | Price: {e.get('price')} ETH"
+        for e in _events(result)
+    ) or "No events found."
+
+
+def format_search(result, arguments: dict) -> str:
+    return "\n".join(
+        f"- [{e.get('id')}] {e.get('name')} | {e.get('date')} | {e.get('location')} | {e.get('price')} ETH"
+        for e in _events(result)
+    ) or "No matching events."
+
+
+def format_event(e: dict, arguments: dict) -> str:
+    return (
+        f"Event: {e.get('name')}\n"
+        f"Date: {e.get('date')}\n"
+        f"Location: {e.get('location')}\n"
+        f"Price: {e.get('price')} ETH\n"
+        f"Capacity: {e.get('capacity', 'N/A')}\n"
+        f"Min Age: {e.get('min_age', 'N/A')}"
+    )
+
+
+def format_events_by_ids(events: list, arguments: dict) -> str:
+    ids = arguments.get("eventIds") or []
+    return "\n\n".join(
+        format_event(event, arguments) if event else f"Event {event_id} not found"
+        for event_id, event in zip(ids, events)
+    ) or "No events found."
+
+
+def format_created(result: dict, arguments: dict) -> str:
+    if result.get("queued"):
+        return (
+            f"⏳ Event is being created\n"
+            f"Name: {result.get('name')}\n"
+            f"Date: {result.get('date')}\n"
+            f"Location: {result.get('location')}\n"
+            f"Price: {result.get('price')}\n"
+            f"Reference: {result.get('idempotency_key')}"
+        )
+    return (
+        f"✅ Event created successfully!\n"
+        f"Event ID: {result.get('id')}\n"
+        f"Name: {result.get('name')}\n"
+        f"Date: {result.get('date')}\n"
+        f"Location: {result.get('location')}\n"
+        f"Price: {result.get('price')}"
+    )
+
+
+EVENT_FIELDS = {
+    "name": {"type": "string", "description": "Name of the event"},
+    "date": {"type": "string", "description": "Date of the event"},
+    "location": {"type": "string", "description": "Location of the event"},
+    "price": {"type": "string", "description": "Price of the event but dont add any currency"},
+    "capacity": {"type": "number", "description": "capacity of the event, default value used if omitted"},
+    "min_age": {"type": "number", "description": "Optional minimum age for the event"},
+}
+EVENT_REQUIRED = ["name", "date", "location", "price", "capacity"]
+
+TOOLS = {tool.name: tool for tool in (
+    Tool(
+        "create_event", "Create a new event in the ICP canister",
+        dict(EVENT_FIELDS, idempotency_key={
+            "type": "string",
+            "description": "Only when retrying an earlier create_event that failed or is still being created: "
+                           "its reference, so the same event is not created twice",
+        }),
+        EVENT_REQUIRED,
+        method="POST", path="/events", read_only=False, body=keyed,
+        format=format_created, records=lambda result: [] if result.get("queued") else [result],
+    ),
+    Tool(
+        "create_events_bulk", "Create many events in the ICP canister in a single call, e.g. when importing a schedule",
+        {"events": {"type": "array", "description": "Events to create", "items": {
+            "type": "object", "properties": EVENT_FIELDS, "required": EVENT_REQUIRED, "additionalProperties": False,
+        }}},
+        ["events"],
+        method="POST", path="/events/bulk", read_only=False, body=lambda args: {"events": [keyed(event) for event in args.get("events", [])]},
+        bulk=lambda args: True,
+        format=format_bulk_result,
+        records=lambda result: [item.get("event") for item in result.get("results", []) if item.get("success")],
+    ),
+    Tool(
+        "get_events", "Get the list of events from the ICP canister please always use ETH for event's price",
+        {
+            "limit": {"type": "number", "description": "Limit the number of events returned"},
+            "offset": {"type": "number", "description": "Skip this many events from the start"},
+        },
+        path="/events", cache_key=("limit", "offset"), format=format_events, rows=_events,
+        bulk=lambda args: _number(args.get("limit"), 0) > SCHEDULER_BULK_PAGE,
+    ),
+    Tool(
+        "get_event_by_id", "Get details of a specific event by its ID",
+        {"eventId": {"type": "string", "description": "ID of the event"}}, ["eventId"],
+        path="/events/{eventId}", cache_key=("eventId",), batch="get_events_by_ids",
+        is_stale=lambda event: event is None,
+        format=format_event, rows=lambda event: [event] if event else [], label="event",
+        records=lambda event: [event],
+    ),
+    Tool(
+        "get_events_by_ids", "Get details of several events by their IDs in one call, e.g. to compare them",
+        {"eventIds": {"type": "array", "items": {"type": "string"}, "description": "IDs of the events"}},
+        ["eventIds"],
+        path="/events/by-ids", params=lambda args: {"ids": ",".join(str(i) for i in args["eventIds"])},
+        each="get_event_by_id", ids_arg="eventIds",
+        format=format_events_by_ids, rows=lambda events: [e for e in events if e], records=lambda events: events,
+    ),
+    Tool(
+        "search_events",
+        "Search all events by text, location, price (ETH) and date (YYYY-MM-DD) range, sorted, top-k. "
+        "Prefer this over get_events for any filtering",
+        {
+            "text": {"type": "string", "description": "Words to match in event name or location"},
+            "location": {"type": "string"},
+            "min_price": {"type": "number"},
+            "max_price": {"type": "number"},
+            "date_from": {"type": "string", "description": "Earliest date, YYYY-MM-DD"},
+            "date_to": {"type": "string", "description": "Latest date, YYYY-MM-DD"},
+            "available_only": {"type": "boolean", "description": "Skip fully booked events"},
+            "sort_by": {"type": "string", "enum": ["date", "price", "name"]},
+            "descending": {"type": "boolean"},
+            "top_k": {"type": "number", "description": "Maximum number of events to return"},
+        },
+        # Served from the event agent's local index, see ToolSet ``handlers``
+        format=format_search, rows=_events, strict=False,
+    ),
+    Tool(
+        "canister_address", "Returns the address of this canister", {},
+        path="/canister-address",
+        format=lambda result, arguments: f"📦 Canister address: {result.get('address')}",
+    ),
+    Tool(
+        "payment", "Returns the payment link for a given event",
+        {"eventId": {"type": "string", "description": "ID of the event to pay for"}}, ["eventId"],
+        path="/payment/{eventId}",
+        format=lambda result, arguments: f"💳 Payment link for event {arguments.get('eventId')}: {result.get('paymentLink')}",
+    ),
+)}
+
+# Tools without side effects, safe to run concurrently and to cache answers for
+READ_ONLY_TOOLS = frozenset(name for name, tool in TOOLS.items() if tool.read_only)
+
+
+class LookupBatcher:
+    """Merges single-key lookups issued together into one ``load_many(keys)`` call.
+
+    Each ``load(key)`` waits ``window`` seconds (one loop turn by default) for
+    siblings, e.g. the concurrent ``get_event_by_id`` calls of one ASI1 turn.
+    ``load_many`` returns results in key order. A lone key still goes to
+    ``load_one``, so a single lookup keeps its usual route.
+    """
+
+    def __init__(self, load_one, load_many, window: float = EVENT_BATCH_WINDOW, max_batch: int = EVENT_BATCH_MAX):
+        self.load_one = load_one
+        self.load_many = load_many
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.stats = {"lookups": 0, "batches": 0, "merged": 0}
+        self._pending = {}
+        self._flush = None
+
+    def load(self, key):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(key, []).append(future)
+        self.stats["lookups"] += 1
+        if self._flush is None:
+            self._flush = asyncio.create_task(self._flush_later())
+        return future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        pending, self._pending, self._flush = self._pending, {}, None
+        keys = list(pending)
+        await asyncio.gather(*(
+            self._dispatch(keys[i:i + self.max_batch], pending) for i in range(0, len(keys), self.max_batch)
+        ))
+
+    async def _dispatch(self, keys: list, pending: dict):
+        try:
+            if len(keys) == 1:
+                results = [await self.load_one(keys[0])]
+            else:
+                results = await self.load_many(keys)
+                self.stats["batches"] += 1
+                self.stats["merged"] += len(keys)
+        except Exception as e:
+            for key in keys:
+                for future in pending[key]:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for key, result in zip(keys, results):
+            for future in pending[key]:
+                if not future.done():
+                    future.set_result(result)
+
+
+class ToolSet:
+    """The tools one agent serves, with dispatch, caching and formatting.
+
+        toolset = ToolSet(["get_events", "payment"], canister)
+        payload = {"tools": toolset.schemas, ...}
+        content = await toolset.execute(name, arguments)
+
+    ``schemas`` is built once and shared by every request. ``handlers`` maps
+    a tool name to a local ``async handler(arguments)`` used instead of the
+    canister. Reads go through the event cache where the tool allows it,
+    writes clear it. Cache misses of a tool with ``batch`` are merged into
+    one call of that tool by a ``LookupBatcher``. With a ``scheduler``, bulk
+    calls wait for a background slot, charged to the sender of the query.
+    """
+
+    def __init__(self, names, canister, handlers: dict = None, encoder: ToolResultEncoder = None, cache=event_cache,
+                 scheduler: Scheduler = None):
+        self.tools = {name: TOOLS[name] for name in names}
+        self.names = frozenset(self.tools)
+        self.schemas = [tool.schema for tool in self.tools.values()]
+        self.canister = canister
+        self.handlers = handlers or {}
+        self.encoder = encoder
+        self.cache = cache
+        self.scheduler = scheduler
+        self.batchers = {
+            tool.name: LookupBatcher(self._loader(tool), self._loader(TOOLS[tool.batch], many=True))
+            for tool in TOOLS.values() if tool.batch is not None
+        }
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.tools
+
+    async def call(self, name: str, arguments: dict):
+        """Run tool ``name`` and return its raw result."""
+        tool = self.tools.get(name)
+        if tool is None:
+            raise ValueError(f"Unsupported function call: {name}")
+        if self.scheduler is not None and tool.bulk is not None and tool.bulk(arguments):
+            async with self.scheduler.slot(BACKGROUND):
+                return await self._run(tool, arguments)
+        return await self._run(tool, arguments)
+
+    async def _run(self, tool: Tool, arguments: dict):
+        handler = self.handlers.get(tool.name)
+        if handler is not None:
+            return await handler(arguments)
+        if tool.each is not None:
+            # One cached lookup per ID; the misses are merged back into a single request
+            each = TOOLS[tool.each]
+            ids = arguments.get(tool.ids_arg) or []
+            return list(await asyncio.gather(*(self._call(each, {each.cache_key[0]: i}) for i in ids)))
+        return await self._call(tool, arguments)
+
+    async def _call(self, tool: Tool, arguments: dict):
+        request = tool.request(arguments)
+        load = lambda: self.canister.call(tool.name, is_stale=tool.is_stale, **request)
+        if tool.cache_key is not None:
+            key = (tool.name,) + tuple(key_part(arguments.get(k)) for k in tool.cache_key)
+            if tool.name in self.batchers:
+                load = lambda: self.batchers[tool.name].load(key[1])
+            return await self.cache.get_or_load(key, load)
+        result = await load()
+        if not tool.read_only:
+            self.cache.clear()
+        return result
+
+    def _loader(self, tool: Tool, many: bool = False):
+        if many:
+            return lambda keys: self._load_many(tool, keys)
+        # A lagging replica answers null for events it has not seen yet; a malformed ID is null everywhere
+        return lambda key: self.canister.call(
+            tool.name, is_stale=tool.is_stale if _event_id(key) else None, **tool.request({tool.cache_key[0]: key})
+        )
+
+    async def _load_many(self, tool: Tool, keys: list) -> list:
+        """``tool`` for ``keys``, asking again as an update only for the well-formed IDs that came back null."""
+        results = await self.canister.call(tool.name, **tool.request({tool.ids_arg: keys}))
+        missing = [index for index, key in enumerate(keys) if results[index] is None and _event_id(key)]
+        if missing:
+            request = tool.request({tool.ids_arg: [keys[index] for index in missing]})
+            for index, result in zip(missing, await self.canister.fallback(**request)):
+                results[index] = result
+        return results
+
+    def format(self, name: str, arguments: dict, result, compact: bool = False) -> str:
+        """Text for ``result``; with ``compact`` row data is encoded as a table because only ASI1 reads it."""
+        tool = self.tools[name]
+        text = tool.format(result, arguments) if tool.format else json.dumps(result)
+        if compact and tool.rows and self.encoder is not None:
+            rows = tool.rows(result)
+            if rows:
+                return self.encoder.encode(rows, label=tool.label, baseline=text)
+        return text
+
+    def records(self, name: str, result) -> list:
+        """Single events ``result`` looked at or created, for sessions and indexes."""
+        tool = self.tools[name]
+        if tool.records is None:
+            return []
+        return [record for record in tool.records(result) if isinstance(record, dict)]
+
+    def stats(self) -> dict:
+        return {name: dict(batcher.stats) for name, batcher in self.batchers.items()}
+
+    async def execute(self, name: str, arguments: dict, compact: bool = False) -> str:
+        return self.format(name, arguments, await self.call(name, arguments), compact)
@@ -0,0 +1,55 @@
+# tool_runner.py
+import os
+import json
+import asyncio
+from metrics import metrics
+from tool_registry import READ_ONLY_TOOLS
+
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "8"))
+
+
+async def run_tool_calls(tool_calls: list, execute, on_error=None, concurrency: int = TOOL_CONCURRENCY):
+    """Execute ASI1 tool calls and return ``(tool_messages, failed_ids)``.
+
+    ``execute(func_name, arguments)`` must return the content string for one
+    call. If ``on_error`` is given, a failing call gets ``on_error(exc)`` as
+    its content and its id is added to ``failed_ids``; otherwise the
+    exception propagates. Consecutive read-only calls fan out under a
+    semaphore of size ``concurrency``; any other tool is a barrier that runs
+    alone, so a write never overlaps with the reads around it. Messages keep
+    the order of ``tool_calls``.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    contents = [None] * len(tool_calls)
+    failed = set()
+
+    async def run(index: int):
+        function = tool_calls[index]["function"]
+        async with semaphore:
+            try:
+                with metrics.span(f"tool.{function['name']}"):
+                    arguments = json.loads(function["arguments"] or "{}")
+                    contents[index] = await execute(function["name"], arguments)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                contents[index] = on_error(e)
+                failed.add(tool_calls[index]["id"])
+
+    batch = []
+    for index, tool_call in enumerate(tool_calls):
+        if tool_call["function"]["name"] in READ_ONLY_TOOLS:
+            batch.append(index)
+            continue
+        if batch:
+            await asyncio.gather(*(run(i) for i in batch))
+            batch = []
+        await run(index)
+    if batch:
+        await asyncio.gather(*(run(i) for i in batch))
+
+    tool_messages = [
+        {"role": "tool", "tool_call_id": tool_call["id"], "content": content}
+        for tool_call, content in zip(tool_calls, contents)
+    ]
+    return tool_messages, failed
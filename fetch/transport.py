@@ -0,0 +1,153 @@
+# transport.py
+import os
+import copy
+import asyncio
+import hashlib
+from json import dumps, loads
+import aiohttp
+
+# ================= POOL CONFIG =================
+ASI1_MAX_CONNECTIONS = int(os.getenv("ASI1_MAX_CONNECTIONS", "32"))
+ASI1_TIMEOUT = float(os.getenv("ASI1_TIMEOUT", "60"))
+CANISTER_MAX_CONNECTIONS = int(os.getenv("CANISTER_MAX_CONNECTIONS", "64"))
+CANISTER_TIMEOUT = float(os.getenv("CANISTER_TIMEOUT", "30"))
+KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+# Share one upstream call between identical concurrent requests
+HTTP_COALESCE = os.getenv("HTTP_COALESCE", "true").lower() in ("1", "true", "yes")
+
+
+class HttpPool:
+    """Keep-alive connection pool for a single upstream host.
+
+    The aiohttp session is created lazily so it binds to the agent's running
+    event loop. ``max_connections`` caps concurrent sockets to the host; extra
+    requests wait in the connector queue instead of opening new connections.
+
+    Requests whose method is in ``coalesce`` are single-flighted: while one is
+    in flight, identical calls (same method, URL, params, headers and body)
+    wait for it and get a copy of its result or its exception.
+    """
+
+    def __init__(self, base_url: str, headers: dict = None, max_connections: int = 32, timeout: float = 30,
+                 coalesce=("GET",)):
+        self.base_url = base_url.rstrip("/")
+        self.headers = dict(headers or {})
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=min(timeout, 10))
+        self.coalesce = frozenset(coalesce) if HTTP_COALESCE else frozenset()
+        self.stats = {"requests": 0, "collapsed": 0}
+        self._inflight = {}
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=connector,
+            )
+        return self._session
+
+    async def request(self, method: str, path: str, *, headers: dict = None, params: dict = None, json=None):
+        # Per-call headers override the pool defaults; a None value drops the header
+        merged = {k: v for k, v in {**self.headers, **(headers or {})}.items() if v is not None}
+        if params:
+            # aiohttp only accepts str/int/float query values, drop unset ones
+            params = {k: str(v) for k, v in params.items() if v is not None}
+        self.stats["requests"] += 1
+        if method not in self.coalesce:
+            return await self._send(method, path, merged, params, json)
+
+        key = hashlib.sha256(
+            dumps([method, path, params, merged, json], sort_keys=True, default=str).encode()
+        ).digest()
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.stats["collapsed"] += 1
+            flight[1] = True
+            # Callers may mutate what they get back, so each waiter gets its own copy
+            return copy.deepcopy(await asyncio.shield(flight[0]))
+        task = asyncio.ensure_future(self._send(method, path, merged, params, json))
+        flight = self._inflight[key] = [task, False]
+        task.add_done_callback(lambda done: self._finish(key, done))
+        # Shielded so a cancelled caller does not cancel the call for everyone else
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result) if flight[1] else result
+
+    def _finish(self, key: bytes, task: asyncio.Future):
+        flight = self._inflight.get(key)
+        if flight is not None and flight[0] is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    async def _send(self, method: str, path: str, headers: dict, params: dict, json):
+        session = self._get_session()
+        async with session.request(
+            method, f"{self.base_url}{path}", headers=headers, params=params, json=json
+        ) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    async def stream(self, method: str, path: str, *, headers: dict = None, json=None):
+        """Yield the JSON payload of each server-sent ``data:`` event until ``[DONE]``."""
+        merged = {k: v for k, v in {**self.headers, **(headers or {})}.items() if v is not None}
+        session = self._get_session()
+        async with session.request(method, f"{self.base_url}{path}", headers=merged, json=json) as resp:
+            resp.raise_for_status()
+            async for raw_line in resp.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                yield loads(data)
+
+    async def get(self, path: str, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_pools = {}
+
+
+def get_pool(base_url: str, headers: dict = None, max_connections: int = 32, timeout: float = 30,
+             coalesce=("GET",)) -> HttpPool:
+    """Return the process-wide pool for ``base_url``, creating it on first use."""
+    pool = _pools.get(base_url)
+    if pool is None:
+        pool = HttpPool(base_url, headers, max_connections, timeout, coalesce)
+        _pools[base_url] = pool
+    return pool
+
+
+def asi1_pool(base_url: str, headers: dict) -> HttpPool:
+    # Chat completions have no side effects, so identical POSTs are shared too
+    return get_pool(base_url, headers, ASI1_MAX_CONNECTIONS, ASI1_TIMEOUT, coalesce=("GET", "POST"))
+
+
+def canister_pool(base_url: str, headers: dict) -> HttpPool:
+    # Canister POSTs create events; only reads are shared
+    return get_pool(base_url, headers, CANISTER_MAX_CONNECTIONS, CANISTER_TIMEOUT, coalesce=("GET",))
+
+
+def pool_stats() -> dict:
+    return {base_url: dict(pool.stats) for base_url, pool in _pools.items()}
+
+
+async def close_pools():
+    for pool in _pools.values():
+        await pool.close()
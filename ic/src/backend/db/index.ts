@@ -4,7 +4,7 @@ import initSqlJs, {
     SqlValue
 } from 'sql.js/dist/sql-asm.js';
 
-import { migrations } from './migrations';
+import { migrations, UNVERSIONED_MIGRATIONS } from './migrations';
 
 export async function initDb(
     bytes: Uint8Array = Uint8Array.from([])
@@ -13,12 +13,17 @@ export async function initDb(
 
     let db = new SQL.Database(bytes);
 
-    if (bytes.length === 0) {
-        for (const migration of migrations) {
-            db.run(migration);
-        }
+    // Jalankan migrasi yang belum diterapkan, juga setelah upgrade canister
+    const version = db.exec('PRAGMA user_version')[0].values[0][0] as number;
+    const applied =
+        bytes.length === 0 || version > 0 ? version : UNVERSIONED_MIGRATIONS;
+
+    for (const migration of migrations.slice(applied)) {
+        db.run(migration);
     }
 
+    db.run(`PRAGMA user_version = ${migrations.length}`);
+
     return db;
 }
 
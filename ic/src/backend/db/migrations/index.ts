@@ -1,4 +1,9 @@
 import { migration0 } from './migration_0';
 import { migration1 } from './migration_1';
+import { migration2 } from './migration_2';
+import { migration3 } from './migration_3';
 
-export const migrations = [migration0,migration1];
\ No newline at end of file
+export const migrations = [migration0,migration1,migration2,migration3];
+
+// Database lama (sebelum user_version dipakai) sudah menjalankan migration0 dan migration1
+export const UNVERSIONED_MIGRATIONS = 2;
@@ -0,0 +1,7 @@
+export const migration2 = `
+    CREATE TABLE idempotency_keys (
+        key TEXT PRIMARY KEY,
+        event_id INTEGER NOT NULL,
+        FOREIGN KEY (event_id) REFERENCES events(id)
+    );
+`;
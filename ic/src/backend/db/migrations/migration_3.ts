@@ -0,0 +1,7 @@
+export const migration3 = `
+    ALTER TABLE events ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
+
+    UPDATE events SET revision = id;
+
+    CREATE INDEX events_revision ON events (revision);
+`;
@@ -46,6 +46,68 @@ export function getEvent(db: Database, id: number): Event | null {
     return events.length === 0 ? null : events[0];
 }
 
+// Ambil banyak event sekaligus dengan satu query IN
+export function getEventsByIds(db: Database, ids: number[]): Event[] {
+    if (ids.length === 0) {
+        return [];
+    }
+
+    const placeholders = ids.map(() => '?').join(', ');
+
+    const queryExecResults = db.exec(
+        `
+            SELECT events.id, events.user_id, events.name, events.date, events.location,
+                   users.id, users.username, users.age, events.price,
+                   events.capacity, events.booked_count, events.min_age
+            FROM events
+            JOIN users ON events.user_id = users.id
+            WHERE events.id IN (${placeholders})
+        `,
+        ids
+    );
+
+    return queryExecResults[0]?.values.map(convertEvent) ?? [];
+}
+
+// Event yang dibuat atau diubah setelah revisi `since`, urut revisi.
+// `revision` adalah revisi event terakhir yang dikirim; tanpa event (mis. limit 0)
+// revisi terbaru tabel, sehingga klien bisa melanjutkan dari sana
+export function getEventChanges(
+    db: Database,
+    since: number,
+    limit: number
+): { events: Event[]; revision: number } {
+    const rows = sqlite<[Event, number]>`
+        SELECT events.id, events.user_id, events.name, events.date, events.location,
+               users.id, users.username, users.age, events.price,
+               events.capacity, events.booked_count, events.min_age, events.revision
+        FROM events
+        JOIN users ON events.user_id = users.id
+        WHERE events.revision > ${since}
+        ORDER BY events.revision ASC
+        LIMIT ${limit}
+    `(db, (sqlValues) => [convertEvent(sqlValues), sqlValues[12] as number]);
+
+    if (rows.length > 0) {
+        return {
+            events: rows.map(([event]) => event),
+            revision: rows[rows.length - 1][1]
+        };
+    }
+
+    return { events: [], revision: Math.max(since, latestRevision(db)) };
+}
+
+// Revisi terbaru di tabel events, 0 jika kosong
+function latestRevision(db: Database): number {
+    const results = sqlite<number>`SELECT COALESCE(MAX(revision), 0) FROM events`(
+        db,
+        (sqlValues) => sqlValues[0] as number
+    );
+
+    return results[0] ?? 0;
+}
+
 // Hitung jumlah event
 export function countEvents(db: Database): number {
     const results = sqlite<number>`SELECT COUNT(*) FROM events`(
@@ -59,10 +121,11 @@ export function countEvents(db: Database): number {
 // Tambah event baru
 export function createEvent(db: Database, eventCreate: EventCreate): Event {
     sqlite`
-        INSERT INTO events (user_id, name, date, location, price, capacity, min_age)
+        INSERT INTO events (user_id, name, date, location, price, capacity, min_age, revision)
         VALUES (${eventCreate.user_id}, ${eventCreate.name}, ${eventCreate.date}, 
                 ${eventCreate.location}, ${eventCreate.price}, ${eventCreate.capacity},
-                ${eventCreate.min_age ?? null})
+                ${eventCreate.min_age ?? null},
+                (SELECT COALESCE(MAX(revision), 0) + 1 FROM events))
     `(db);
 
     const id = sqlite<number>`SELECT last_insert_rowid()`(
@@ -79,6 +142,23 @@ export function createEvent(db: Database, eventCreate: EventCreate): Event {
     return event;
 }
 
+// Event yang sudah dibuat dengan idempotency key ini, null jika belum ada
+export function getEventByIdempotencyKey(db: Database, key: string): Event | null {
+    const eventIds = sqlite<number>`
+        SELECT event_id FROM idempotency_keys WHERE key = ${key}
+    `(db, (sqlValues) => sqlValues[0] as number);
+
+    return eventIds.length === 0 ? null : getEvent(db, eventIds[0]);
+}
+
+// Simpan idempotency key untuk event yang baru dibuat
+export function saveIdempotencyKey(db: Database, key: string, eventId: number): void {
+    sqlite`
+        INSERT OR REPLACE INTO idempotency_keys (key, event_id)
+        VALUES (${key}, ${eventId})
+    `(db);
+}
+
 // Update event
 export function updateEvent(db: Database, eventUpdate: EventUpdate): Event {
     sqlite`
@@ -90,7 +170,8 @@ export function updateEvent(db: Database, eventUpdate: EventUpdate): Event {
             price = COALESCE(${eventUpdate.price}, price),
             capacity = COALESCE(${eventUpdate.capacity}, capacity),
             booked_count = COALESCE(${eventUpdate.booked_count}, booked_count),
-            min_age = COALESCE(${eventUpdate.min_age}, min_age)
+            min_age = COALESCE(${eventUpdate.min_age}, min_age),
+            revision = (SELECT COALESCE(MAX(revision), 0) + 1 FROM events)
         WHERE id = ${eventUpdate.id}
     `(db);
 
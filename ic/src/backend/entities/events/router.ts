@@ -8,10 +8,28 @@ import {
     createEvent,
     deleteEvent,
     getEvent,
+    getEventChanges,
     getEvents,
+    getEventByIdempotencyKey,
+    getEventsByIds,
+    saveIdempotencyKey,
     updateEvent
 } from './db';
 
+const MAX_BULK_EVENTS = 1_000;
+const MAX_LOOKUP_IDS = 100;
+const MAX_CHANGES = 1_000;
+
+type EventInput = {
+    name: string;
+    date: string;
+    location: string;
+    price: string;
+    capacity: number;
+    min_age?: number;
+    idempotency_key?: string;
+};
+
 export function getRouter(): Router {
     const router = express.Router();
 
@@ -36,6 +54,56 @@ export function getRouter(): Router {
         res.json(countEvents(db));
     });
 
+    // Event yang berubah sejak revisi tertentu, ?since=120&limit=100
+    // Harus didaftarkan sebelum '/:id'; dipakai agent untuk memperbarui indeks pencarian
+    router.get(
+        '/changes',
+        (req: Request<any, any, any, { since?: string; limit?: string }>, res) => {
+            const since = Number(req.query.since ?? 0);
+            const limit = Number(req.query.limit ?? 100);
+
+            if (!Number.isInteger(since) || !Number.isInteger(limit) || limit < 0) {
+                res.status(400).json({ error: '"since" and "limit" must be integers' });
+                return;
+            }
+
+            res.json(getEventChanges(db, since, Math.min(limit, MAX_CHANGES)));
+        }
+    );
+
+    // Ambil banyak event berdasarkan ID, ?ids=3,7,12
+    // Harus didaftarkan sebelum '/:id'; hasil mengikuti urutan ids,
+    // null jika tidak ada atau ID tidak valid (mis. "ev12345")
+    router.get(
+        '/by-ids',
+        (req: Request<any, any, any, { ids?: string }>, res) => {
+            const ids = (req.query.ids ?? '')
+                .split(',')
+                .map((id) => id.trim())
+                .filter((id) => id !== '')
+                .map((id) => (/^\d+$/.test(id) ? Number(id) : null));
+
+            if (ids.length === 0) {
+                res.status(400).json({ error: '"ids" must be a comma separated list of event IDs' });
+                return;
+            }
+
+            if (ids.length > MAX_LOOKUP_IDS) {
+                res.status(400).json({
+                    error: `At most ${MAX_LOOKUP_IDS} IDs per request`
+                });
+                return;
+            }
+
+            const valid = ids.filter((id): id is number => id !== null);
+            const byId = new Map(
+                getEventsByIds(db, [...new Set(valid)]).map((event) => [event.id, event])
+            );
+
+            res.json(ids.map((id) => (id === null ? null : byId.get(id) ?? null)));
+        }
+    );
+
     // Ambil 1 event
     router.get('/:id', (req, res) => {
         const { id } = req.params;
@@ -58,11 +126,24 @@ export function getRouter(): Router {
                 price: string;
                 capacity: number;
                 min_age?: number;
+                idempotency_key?: string;
             }
         >,
         res
     ) => {
             const { name, date, location, price, capacity, min_age } = req.body;
+            const key = req.body.idempotency_key ?? req.get('Idempotency-Key');
+
+            // Permintaan ulang dengan key yang sama mengembalikan event yang sudah dibuat
+            if (key !== undefined) {
+                const existing = getEventByIdempotencyKey(db, key);
+
+                if (existing !== null) {
+                    res.set('Idempotent-Replayed', 'true');
+                    res.json(existing);
+                    return;
+                }
+            }
 
             // contoh: buat user organizer dummy
             const user = createUser(db, {
@@ -80,6 +161,10 @@ export function getRouter(): Router {
                 min_age
             });
 
+            if (key !== undefined) {
+                saveIdempotencyKey(db, key, event.id);
+            }
+
             res.json(event);
         }
     );
@@ -110,6 +195,79 @@ export function getRouter(): Router {
         });
     });
 
+    // Bulk buat event dari payload, satu update call untuk semua item
+    router.post(
+        '/bulk',
+        (req: Request<any, any, { events: EventInput[] }>, res) => {
+            const { events } = req.body;
+
+            if (!Array.isArray(events) || events.length === 0) {
+                res.status(400).json({ error: '"events" must be a non-empty array' });
+                return;
+            }
+
+            if (events.length > MAX_BULK_EVENTS) {
+                res.status(400).json({
+                    error: `At most ${MAX_BULK_EVENTS} events per request`
+                });
+                return;
+            }
+
+            // Satu organizer untuk seluruh batch, hanya dibuat jika ada event baru
+            let userId: number | undefined;
+
+            const results = events.map((input, index) => {
+                const error = validateEventInput(input);
+
+                if (error !== null) {
+                    return { index, success: false, error };
+                }
+
+                // Item yang sudah pernah dibuat dengan key yang sama tidak dibuat ulang
+                if (input.idempotency_key !== undefined) {
+                    const existing = getEventByIdempotencyKey(db, input.idempotency_key);
+
+                    if (existing !== null) {
+                        return { index, success: true, event: existing, replayed: true };
+                    }
+                }
+
+                try {
+                    if (userId === undefined) {
+                        userId = createUser(db, {
+                            username: `organizer${v4()}`,
+                            age: 30
+                        }).id;
+                    }
+
+                    const event = createEvent(db, {
+                        user_id: userId,
+                        name: input.name,
+                        date: input.date,
+                        location: input.location,
+                        price: input.price,
+                        capacity: input.capacity,
+                        min_age: input.min_age
+                    });
+
+                    if (input.idempotency_key !== undefined) {
+                        saveIdempotencyKey(db, input.idempotency_key, event.id);
+                    }
+
+                    return { index, success: true, event };
+                } catch (err: any) {
+                    return { index, success: false, error: err.message };
+                }
+            });
+
+            res.json({
+                created: results.filter((result) => result.success).length,
+                failed: results.filter((result) => !result.success).length,
+                results
+            });
+        }
+    );
+
     // Update event (PUT/PATCH)
     router.put('/', updateHandler);
     router.patch('/', updateHandler);
@@ -159,3 +317,32 @@ function updateHandler(
 
     res.json(event);
 }
+
+function validateEventInput(input: EventInput): string | null {
+    if (typeof input !== 'object' || input === null) {
+        return 'Event must be an object';
+    }
+
+    for (const field of ['name', 'date', 'location', 'price'] as const) {
+        if (typeof input[field] !== 'string' || input[field].length === 0) {
+            return `"${field}" is required`;
+        }
+    }
+
+    if (typeof input.capacity !== 'number') {
+        return '"capacity" must be a number';
+    }
+
+    if (input.min_age !== undefined && typeof input.min_age !== 'number') {
+        return '"min_age" must be a number';
+    }
+
+    if (
+        input.idempotency_key !== undefined &&
+        (typeof input.idempotency_key !== 'string' || input.idempotency_key.length === 0)
+    ) {
+        return '"idempotency_key" must be a non-empty string';
+    }
+
+    return null;
+}
@@ -133,5 +133,146 @@ export function getTests(canisterId: string): Test {
 
             expect(responseJson).toBe(7n);
         });
+
+        it('creates events in bulk and reports a result per item', async () => {
+            const response = await fetch(`${origin}/events/bulk`, {
+                method: 'POST',
+                headers: [['Content-Type', 'application/json']],
+                body: JSON.stringify({
+                    events: [
+                        {
+                            name: 'Bulk Event',
+                            date: '2025-09-01',
+                            location: 'Jakarta',
+                            price: '0.01',
+                            capacity: 50
+                        },
+                        { name: 'Missing fields' }
+                    ]
+                })
+            });
+            const responseJson = await response.json();
+
+            expect(responseJson.created).toBe(1);
+            expect(responseJson.failed).toBe(1);
+            expect(responseJson.results[0].event.name).toBe('Bulk Event');
+            expect(responseJson.results[1].error).toBe('"date" is required');
+        });
+
+        it('gets many events by ID in one request, in request order', async () => {
+            const created = await fetch(`${origin}/events/bulk`, {
+                method: 'POST',
+                headers: [['Content-Type', 'application/json']],
+                body: JSON.stringify({
+                    events: ['First', 'Second'].map((name) => ({
+                        name,
+                        date: '2025-09-02',
+                        location: 'Bali',
+                        price: '0.02',
+                        capacity: 10
+                    }))
+                })
+            });
+            const [first, second] = (await created.json()).results.map(
+                (result: any) => result.event.id
+            );
+
+            const response = await fetch(
+                `${origin}/events/by-ids?ids=${second},999999,ev12345,${first}`
+            );
+            const responseJson = await response.json();
+
+            expect(response.status).toBe(200);
+            expect(responseJson).toHaveLength(4);
+            expect(responseJson[0].name).toBe('Second');
+            expect(responseJson[1]).toBe(null);
+            expect(responseJson[2]).toBe(null);
+            expect(responseJson[3].name).toBe('First');
+        });
+
+        it('creates an event only once per idempotency key', async () => {
+            const create = (): Promise<Response> =>
+                fetch(`${origin}/events`, {
+                    method: 'POST',
+                    headers: [['Content-Type', 'application/json']],
+                    body: JSON.stringify({
+                        name: 'Idempotent Event',
+                        date: '2025-09-03',
+                        location: 'Bandung',
+                        price: '0.03',
+                        capacity: 20,
+                        idempotency_key: 'test-idempotent-event'
+                    })
+                });
+
+            const first = await create();
+            const second = await create();
+            const firstJson = await first.json();
+            const secondJson = await second.json();
+
+            expect(second.headers.get('Idempotent-Replayed')).toBe('true');
+            expect(secondJson.id).toBe(firstJson.id);
+            expect(secondJson.user.id).toBe(firstJson.user.id);
+
+            const bulk = await fetch(`${origin}/events/bulk`, {
+                method: 'POST',
+                headers: [['Content-Type', 'application/json']],
+                body: JSON.stringify({
+                    events: [
+                        {
+                            name: 'Idempotent Event',
+                            date: '2025-09-03',
+                            location: 'Bandung',
+                            price: '0.03',
+                            capacity: 20,
+                            idempotency_key: 'test-idempotent-event'
+                        }
+                    ]
+                })
+            });
+            const bulkJson = await bulk.json();
+
+            expect(bulkJson.created).toBe(1);
+            expect(bulkJson.results[0].replayed).toBe(true);
+            expect(bulkJson.results[0].event.id).toBe(firstJson.id);
+        });
+
+        it('lists events changed since a revision, oldest change first', async () => {
+            const latest = await fetch(`${origin}/events/changes?since=0&limit=0`);
+            const { revision } = await latest.json();
+
+            const created = await fetch(`${origin}/events`, {
+                method: 'POST',
+                headers: [['Content-Type', 'application/json']],
+                body: JSON.stringify({
+                    name: 'Changed Event',
+                    date: '2025-09-04',
+                    location: 'Medan',
+                    price: '0.04',
+                    capacity: 30
+                })
+            });
+            const createdJson = await created.json();
+
+            await fetch(`${origin}/events`, {
+                method: 'PATCH',
+                headers: [['Content-Type', 'application/json']],
+                body: JSON.stringify({ id: createdJson.id, name: 'Renamed Event' })
+            });
+
+            const response = await fetch(`${origin}/events/changes?since=${revision}`);
+            const responseJson = await response.json();
+
+            expect(responseJson.events).toHaveLength(1);
+            expect(responseJson.events[0].id).toBe(createdJson.id);
+            expect(responseJson.events[0].name).toBe('Renamed Event');
+            expect(responseJson.revision).toBe(revision + 2);
+
+            const after = await fetch(
+                `${origin}/events/changes?since=${responseJson.revision}`
+            );
+
+            expect((await after.json()).events).toHaveLength(0);
+        });
     };
 }
\ No newline at end of file